@@ -1,18 +1,41 @@
 """Database helpers for the Build for India service."""
 from __future__ import annotations
 
+import csv
+import io
 import logging
 import os
+import threading
 from contextlib import contextmanager
-from datetime import datetime
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import psycopg2
 from psycopg2 import sql
-from psycopg2.extras import Json, RealDictCursor, execute_values
+from psycopg2.extensions import make_dsn, parse_dsn
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import Json, NamedTupleCursor, execute_values
 
 LOGGER = logging.getLogger(__name__)
 
+# Every NUMERIC this service reads (USD values, shares, scores) ends up as a
+# float, so pooled connections decode it as one instead of building a Decimal
+# per cell. Registered per connection so other psycopg2 users are unaffected.
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    "NUMERIC_AS_FLOAT",
+    lambda value, cur: float(value) if value is not None else None,
+)
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """Connection created by the pool, with NUMERIC decoded as float."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, self)
+
 
 class DatabaseError(RuntimeError):
     """Raised when the database configuration is missing."""
@@ -25,19 +48,98 @@ def _database_url() -> str:
     return url
 
 
+# TCP keepalives stop idle pooled sessions from being silently dropped by cloud
+# load balancers. Values already present in DATABASE_URL take precedence.
+_CONNECTION_DEFAULTS = {
+    "keepalives": "1",
+    "keepalives_idle": "30",
+    "keepalives_interval": "10",
+    "keepalives_count": "5",
+    "application_name": "buildforindia",
+}
+_MANAGED_HOST_SUFFIXES = (
+    ".railway.app",
+    ".rlwy.net",
+    ".rds.amazonaws.com",
+    ".neon.tech",
+    ".supabase.co",
+)
+
+
+@lru_cache(maxsize=4)
+def _dsn(url: str) -> str:
+    """Return ``url`` as a libpq DSN with keepalive and TLS defaults applied."""
+
+    parsed = parse_dsn(url)
+    extra = {key: value for key, value in _CONNECTION_DEFAULTS.items() if key not in parsed}
+    host = parsed.get("host") or ""
+    if "sslmode" not in parsed and host.endswith(_MANAGED_HOST_SUFFIXES):
+        extra["sslmode"] = "require"
+    return make_dsn(url, **extra)
+
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadedConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                minconn = int(os.getenv("DB_POOL_MIN", "2"))
+                maxconn = int(os.getenv("DB_POOL_MAX", "25"))
+                _pool = ThreadedConnectionPool(
+                    minconn,
+                    maxconn,
+                    dsn=_dsn(_database_url()),
+                    connection_factory=_PooledConnection,
+                )
+                LOGGER.info("Database pool created (min=%s, max=%s)", minconn, maxconn)
+    return _pool
+
+
+def close_pool() -> None:
+    """Close every pooled connection (used on shutdown and in tests)."""
+
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
 @contextmanager
 def connect():
-    """Yield a psycopg2 connection configured for manual transactions."""
+    """Yield a pooled psycopg2 connection configured for manual transactions."""
 
-    conn = psycopg2.connect(_database_url())
+    pool = _get_pool()
+    conn = pool.getconn()
     try:
         yield conn
         conn.commit()
     except Exception:  # pragma: no cover - defensive rollback
-        conn.rollback()
+        if not conn.closed:
+            conn.rollback()
         raise
     finally:
-        conn.close()
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def configure_bulk_load(conn) -> None:
+    """Turn off ``synchronous_commit`` for the rest of the current transaction.
+
+    A crash right after COMMIT can then lose the last load. That is acceptable
+    for re-runnable ETL jobs but must not be used on the API path.
+    """
+
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL synchronous_commit = off")
+
+
+_SCHEMA_LOCK_ID = 4_242_001
 
 
 def init_db(conn) -> None:
@@ -57,6 +159,11 @@ def init_db(conn) -> None:
             updated_at timestamptz DEFAULT now()
         )
         """,
+        # Serves the sector filter's array containment (@>) and overlap (&&).
+        """
+        CREATE INDEX IF NOT EXISTS ix_products_sectors
+          ON products USING GIN (sectors)
+        """,
         """
         CREATE TABLE IF NOT EXISTS monthly_imports (
             id SERIAL PRIMARY KEY,
@@ -79,11 +186,26 @@ def init_db(conn) -> None:
         CREATE UNIQUE INDEX IF NOT EXISTS uq_monthly_imports_hs_ym_partner
           ON monthly_imports (hs_code, year, month, partner_country)
         """,
+        # Create the expression index and refresh planner statistics in the
+        # same step so make_date(...) range filters use it straight away.
+        """
+        DO $$
+        BEGIN
+          IF to_regclass('ix_monthly_imports_hs_date') IS NULL THEN
+            CREATE INDEX ix_monthly_imports_hs_date
+              ON monthly_imports (hs_code, make_date(year, month, 1));
+            ANALYZE monthly_imports;
+          END IF;
+        END
+        $$
+        """,
         """
         CREATE TABLE IF NOT EXISTS baseline_imports (
             hs_code TEXT PRIMARY KEY REFERENCES products(hs_code),
             baseline_12m_usd NUMERIC,
             baseline_period TEXT,
+            baseline_start DATE,
+            baseline_end DATE,
             updated_at timestamptz DEFAULT now()
         )
         """,
@@ -115,150 +237,214 @@ def init_db(conn) -> None:
             created_at timestamptz DEFAULT now()
         )
         """,
-    ]
-    with conn.cursor() as cur:
-        for statement in statements:
-            cur.execute(statement)
-        cur.execute(
-            "ALTER TABLE monthly_imports ADD COLUMN IF NOT EXISTS value_inr NUMERIC"
-        )
-        cur.execute(
-            "ALTER TABLE monthly_imports ADD COLUMN IF NOT EXISTS fx_rate NUMERIC"
-        )
+        "ALTER TABLE monthly_imports ADD COLUMN IF NOT EXISTS value_inr NUMERIC",
+        "ALTER TABLE monthly_imports ADD COLUMN IF NOT EXISTS fx_rate NUMERIC",
         # Ensure timestamp columns on products (for idempotency across schema evolutions)
-        cur.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS created_at timestamptz DEFAULT now()")
-        cur.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now()")
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS created_at timestamptz DEFAULT now()",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now()",
         # Similarly for other tables if needed (e.g., baseline_imports already has updated_at in CREATE)
-        cur.execute("ALTER TABLE baseline_imports ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now()")
-        cur.execute("ALTER TABLE import_progress ADD COLUMN IF NOT EXISTS last_updated timestamptz DEFAULT now()")
-        cur.execute("ALTER TABLE domestic_capability ADD COLUMN IF NOT EXISTS created_at timestamptz DEFAULT now()")
+        "ALTER TABLE baseline_imports ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now()",
+        "ALTER TABLE baseline_imports ADD COLUMN IF NOT EXISTS baseline_start DATE",
+        "ALTER TABLE baseline_imports ADD COLUMN IF NOT EXISTS baseline_end DATE",
+        "ALTER TABLE import_progress ADD COLUMN IF NOT EXISTS last_updated timestamptz DEFAULT now()",
+        "ALTER TABLE domestic_capability ADD COLUMN IF NOT EXISTS created_at timestamptz DEFAULT now()",
+    ]
+    # One round-trip for the whole script; the transaction-scoped advisory lock
+    # serialises concurrent boots so they do not race on the DDL.
+    script = ";\n".join([f"SELECT pg_advisory_xact_lock({_SCHEMA_LOCK_ID})", *statements])
+    with conn.cursor() as cur:
+        cur.execute(script)
     LOGGER.info("Database schema ensured")
 
 
-def upsert_product(
+def bulk_upsert_products(
     conn,
+    rows: Iterable[Tuple[str, str, str, Sequence[str], Optional[float], Optional[float]]],
     *,
-    hs_code: str,
-    title: str,
-    description: str,
-    sectors: Sequence[str],
-    capex_min,
-    capex_max,
-) -> None:
+    page_size: int = 500,
+) -> int:
+    """Upsert many products in one statement.
+
+    Rows are ``(hs_code, title, description, sectors, capex_min, capex_max)``
+    tuples and must not repeat an ``hs_code``. Products whose stored values
+    already match are left untouched, so re-loads do not rewrite them.
+    """
+
+    values = [
+        (hs_code, title, description, list(sectors or []), capex_min, capex_max)
+        for hs_code, title, description, sectors, capex_min, capex_max in rows
+    ]
+    if not values:
+        return 0
     with conn.cursor() as cur:
-        cur.execute(
+        execute_values(
+            cur,
             """
             INSERT INTO products (hs_code, title, description, sectors, capex_min, capex_max, updated_at)
-            VALUES (%s, %s, %s, %s, %s, %s, now())
+            VALUES %s
             ON CONFLICT (hs_code) DO UPDATE
             SET title = EXCLUDED.title,
                 description = EXCLUDED.description,
                 sectors = EXCLUDED.sectors,
                 capex_min = COALESCE(EXCLUDED.capex_min, products.capex_min),
                 capex_max = COALESCE(EXCLUDED.capex_max, products.capex_max),
-                updated_at = now()
+                updated_at = EXCLUDED.updated_at
+            WHERE (products.title, products.description, products.sectors, products.capex_min, products.capex_max)
+                  IS DISTINCT FROM (
+                      EXCLUDED.title,
+                      EXCLUDED.description,
+                      EXCLUDED.sectors,
+                      COALESCE(EXCLUDED.capex_min, products.capex_min),
+                      COALESCE(EXCLUDED.capex_max, products.capex_max)
+                  )
             """,
-            (hs_code, title, description, list(sectors or []), capex_min, capex_max),
+            values,
+            template="(%s, %s, %s, %s::text[], %s, %s, now())",
+            page_size=page_size,
         )
+    return len(values)
+
+
+COPY_CHUNK_ROWS = 10_000
 
 
-def insert_monthly(
+def copy_monthly(
     conn,
+    rows: Iterable[Tuple[str, int, int, Optional[float], Optional[float], Optional[float], Optional[float], Optional[str]]],
     *,
-    hs_code: str,
-    year: int,
-    month: int,
-    value_usd,
-    value_inr,
-    fx_rate,
-    qty,
-    partner: Optional[str],
-) -> None:
+    chunk_rows: int = COPY_CHUNK_ROWS,
+    bulk_load: bool = False,
+) -> int:
+    """Upsert monthly rows by streaming them through ``COPY`` into a staging table.
+
+    Rows are ``(hs_code, year, month, value_usd, value_inr, fx_rate, qty, partner)``
+    tuples. They are copied in chunks of ``chunk_rows`` so memory stays bounded,
+    then merged with a single upsert. When the same key appears more than once
+    the last row wins. ``bulk_load`` applies :func:`configure_bulk_load` just
+    before the first COPY, once the first chunk of rows has been produced, so
+    streaming ETL sources do not hold a transaction open while they fetch.
+    """
+
+    iterator = iter(rows)
+    count = 0
     with conn.cursor() as cur:
+        while True:
+            chunk = list(islice(iterator, chunk_rows))
+            if not chunk:
+                break
+            if not count:
+                if bulk_load:
+                    configure_bulk_load(conn)
+                cur.execute(
+                    """
+                    CREATE TEMP TABLE IF NOT EXISTS monthly_imports_stage (
+                        seq BIGSERIAL,
+                        hs_code TEXT,
+                        year INT,
+                        month INT,
+                        value_usd NUMERIC,
+                        value_inr NUMERIC,
+                        fx_rate NUMERIC,
+                        qty NUMERIC,
+                        partner_country TEXT
+                    )
+                    """
+                )
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(chunk)
+            buffer.seek(0)
+            cur.copy_expert(
+                """
+                COPY monthly_imports_stage (hs_code, year, month, value_usd, value_inr, fx_rate, qty, partner_country)
+                FROM STDIN WITH (FORMAT CSV)
+                """,
+                buffer,
+            )
+            count += len(chunk)
+        if not count:
+            return 0
         cur.execute(
             """
-            INSERT INTO monthly_imports (
-                hs_code, year, month, value_usd, value_inr, fx_rate, qty, partner_country
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO monthly_imports (hs_code, year, month, value_usd, value_inr, fx_rate, qty, partner_country)
+            SELECT DISTINCT ON (hs_code, year, month, partner_country)
+                   hs_code, year, month, value_usd, value_inr, fx_rate, qty, partner_country
+            FROM monthly_imports_stage
+            ORDER BY hs_code, year, month, partner_country, seq DESC
             ON CONFLICT (hs_code, year, month, partner_country) DO UPDATE
-                SET value_usd = EXCLUDED.value_usd,
-                    value_inr = EXCLUDED.value_inr,
-                    fx_rate = EXCLUDED.fx_rate,
-                    qty = EXCLUDED.qty
-            """,
-            (hs_code, year, month, value_usd, value_inr, fx_rate, qty, partner),
+              SET value_usd = EXCLUDED.value_usd,
+                  value_inr = EXCLUDED.value_inr,
+                  fx_rate = EXCLUDED.fx_rate,
+                  qty = EXCLUDED.qty
+            """
         )
+        cur.execute("TRUNCATE monthly_imports_stage")
+    return count
 
 
-def bulk_insert_monthly(
+def seed_monthly(
     conn,
-    rows: Iterable[Tuple[str, int, int, float, Optional[float], Optional[float], Optional[str]]],
+    rows: Iterable[Tuple[str, Optional[float], Optional[str]]],
+    *,
+    year: int,
+    page_size: int = 1000,
 ) -> int:
-    """Insert many monthly rows with upsert semantics."""
+    """Upsert the same value into all twelve months of ``year`` per product.
 
-    rows = list(rows)
-    if not rows:
+    Rows are ``(hs_code, value_usd, partner)`` tuples; ``generate_series`` fans
+    each one out to its months server-side, so only one tuple per product is
+    sent. Later rows win for a repeated ``(hs_code, partner)``, as with
+    :func:`copy_monthly`. Returns the number of monthly rows upserted.
+    """
+
+    latest = {(hs_code, partner): (hs_code, year, value, partner) for hs_code, value, partner in rows}
+    if not latest:
         return 0
     with conn.cursor() as cur:
         execute_values(
             cur,
             """
             INSERT INTO monthly_imports (hs_code, year, month, value_usd, value_inr, fx_rate, qty, partner_country)
-            VALUES %s
+            SELECT v.hs_code, v.year, g.month, v.value_usd, NULL, NULL, NULL, v.partner_country
+            FROM (VALUES %s) AS v (hs_code, year, value_usd, partner_country)
+            CROSS JOIN generate_series(1, 12) AS g (month)
             ON CONFLICT (hs_code, year, month, partner_country) DO UPDATE
               SET value_usd = EXCLUDED.value_usd,
                   value_inr = EXCLUDED.value_inr,
                   fx_rate = EXCLUDED.fx_rate,
                   qty = EXCLUDED.qty
             """,
-            rows,
+            list(latest.values()),
+            template="(%s, %s::int, %s::numeric, %s)",
+            page_size=page_size,
         )
-    return len(rows)
+    return len(latest) * 12
 
 
-def upsert_baseline(
+def bulk_upsert_progress(
     conn,
+    rows: Iterable[Tuple[str, Any, Any, Any, Any, Any, Any, Any, Any]],
     *,
-    hs_code: str,
-    baseline_value,
-    baseline_period: Optional[str],
-) -> None:
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO baseline_imports (hs_code, baseline_12m_usd, baseline_period, updated_at)
-            VALUES (%s, %s, %s, now())
-            ON CONFLICT (hs_code) DO UPDATE
-              SET baseline_12m_usd = EXCLUDED.baseline_12m_usd,
-                  baseline_period = EXCLUDED.baseline_period,
-                  updated_at = now()
-            """,
-            (hs_code, baseline_value, baseline_period),
-        )
+    page_size: int = 1000,
+) -> int:
+    """Upsert many import_progress rows at once.
 
+    Rows are ``(hs_code, baseline_value, current_value, reduction_abs,
+    reduction_pct, hhi_baseline, hhi_current, concentration_shift,
+    opportunity_score)`` tuples.
+    """
 
-def upsert_progress(
-    conn,
-    *,
-    hs_code: str,
-    baseline_value,
-    current_value,
-    reduction_abs,
-    reduction_pct,
-    hhi_baseline,
-    hhi_current,
-    concentration_shift,
-    opportunity_score,
-) -> None:
+    values = list(rows)
+    if not values:
+        return 0
     with conn.cursor() as cur:
-        cur.execute(
+        execute_values(
+            cur,
             """
             INSERT INTO import_progress (
                 hs_code, baseline_12m_usd, current_12m_usd, reduction_abs, reduction_pct,
                 hhi_baseline, hhi_current, concentration_shift, opportunity_score, last_updated
             )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, now())
+            VALUES %s
             ON CONFLICT (hs_code) DO UPDATE
               SET baseline_12m_usd = EXCLUDED.baseline_12m_usd,
                   current_12m_usd = EXCLUDED.current_12m_usd,
@@ -268,98 +454,113 @@ def upsert_progress(
                   hhi_current = EXCLUDED.hhi_current,
                   concentration_shift = EXCLUDED.concentration_shift,
                   opportunity_score = EXCLUDED.opportunity_score,
-                  last_updated = now()
+                  last_updated = EXCLUDED.last_updated
             """,
-            (
-                hs_code,
-                baseline_value,
-                current_value,
-                reduction_abs,
-                reduction_pct,
-                hhi_baseline,
-                hhi_current,
-                concentration_shift,
-                opportunity_score,
-            ),
+            values,
+            template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, now())",
+            page_size=page_size,
         )
-
-
-def fetch_last_36m(conn, hs_code: str) -> List[Dict]:
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            """
-            SELECT year, month, value_usd, value_inr, fx_rate, qty, partner_country
-            FROM monthly_imports
-            WHERE hs_code = %s
-            ORDER BY year DESC, month DESC
-            LIMIT 36
-            """,
-            (hs_code,),
-        )
-        rows = cur.fetchall()
-    return list(reversed(rows))
-
-
-def partner_shares(
+    return len(values)
+
+
+# JSON columns for the product bound to ``%(hs_code)s``: its 36 most recent
+# monthly rows in chronological order, and its five largest partners by total
+# USD value as ``{partner_country, total}`` objects. Spliced into the
+# product-detail SELECT so the endpoint needs a single round-trip.
+PRODUCT_ACTIVITY_COLUMNS = """
+  (
+    SELECT COALESCE(
+             json_agg(
+               json_build_object(
+                 'year', year, 'month', month, 'value_usd', value_usd,
+                 'value_inr', value_inr, 'fx_rate', fx_rate, 'qty', qty,
+                 'partner_country', partner_country
+               )
+               ORDER BY year, month
+             ),
+             '[]'::json
+           )
+    FROM (
+        SELECT year, month, value_usd, value_inr, fx_rate, qty, partner_country
+        FROM monthly_imports
+        WHERE hs_code = %(hs_code)s
+        ORDER BY year DESC, month DESC
+        LIMIT 36
+    ) AS recent
+  ) AS timeseries,
+  (
+    SELECT COALESCE(
+             json_agg(
+               json_build_object('partner_country', partner_country, 'total', total)
+               ORDER BY total DESC
+             ),
+             '[]'::json
+           )
+    FROM (
+        SELECT partner_country, SUM(value_usd) AS total
+        FROM monthly_imports
+        WHERE hs_code = %(hs_code)s
+        GROUP BY partner_country
+        ORDER BY total DESC
+        LIMIT 5
+    ) AS top_partners
+  ) AS partners
+"""
+
+
+def partner_shares_many(
     conn,
-    hs_code: str,
+    windows: Iterable[Tuple[str, str, Tuple[int, int], Tuple[int, int]]],
     *,
-    start: Tuple[int, int],
-    end: Tuple[int, int],
-) -> Dict[str, float]:
-    """Return partner share fractions for a period inclusive."""
-
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
+    page_size: int = 500,
+) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """Return partner shares for many ``(hs_code, label, start, end)`` windows.
+
+    Each window's shares are the partners' fractions of its total USD value over
+    the inclusive month range. One query is issued per ``page_size`` windows.
+    Results are keyed by ``(hs_code, label)``; windows without imports are
+    omitted.
+    """
+
+    values = [
+        (hs_code, label, start[0], start[1], end[0], end[1])
+        for hs_code, label, start, end in windows
+    ]
+    if not values:
+        return {}
+    with conn.cursor() as cur:
+        rows = execute_values(
+            cur,
             """
-            SELECT partner_country, SUM(value_usd) AS total
-            FROM monthly_imports
-            WHERE hs_code = %s
-              AND (
-                    (year > %s OR (year = %s AND month >= %s))
-                AND (year < %s OR (year = %s AND month <= %s))
-              )
-            GROUP BY partner_country
-            HAVING SUM(value_usd) IS NOT NULL
+            SELECT w.hs_code, w.label, m.partner_country,
+                   SUM(m.value_usd)
+                     / NULLIF(SUM(SUM(m.value_usd)) OVER (PARTITION BY w.hs_code, w.label), 0) AS share
+            FROM (VALUES %s) AS w (hs_code, label, start_date, end_date)
+            JOIN monthly_imports m
+              ON m.hs_code = w.hs_code
+             AND make_date(m.year, m.month, 1) BETWEEN w.start_date AND w.end_date
+            GROUP BY w.hs_code, w.label, m.partner_country
+            HAVING SUM(m.value_usd) IS NOT NULL
             """,
-            (hs_code, start[0], start[0], start[1], end[0], end[0], end[1]),
+            values,
+            template="(%s, %s, make_date(%s, %s, 1), make_date(%s, %s, 1))",
+            page_size=page_size,
+            fetch=True,
         )
-        rows = cur.fetchall()
-    total = sum(float(row["total"]) for row in rows if row["total"] is not None)
-    if total <= 0:
-        return {}
-    return {row["partner_country"]: float(row["total"]) / total for row in rows if row["total"] is not None}
-
-
-def fetch_monthly_series(
-    conn,
-    hs_code: str,
-    *,
-    start: Optional[Tuple[int, int]] = None,
-    end: Optional[Tuple[int, int]] = None,
-) -> List[Dict]:
-    query = [
-        "SELECT year, month, SUM(value_usd) AS total"
-        " FROM monthly_imports",
-        " WHERE hs_code = %s",
-    ]
-    params: List = [hs_code]
-    if start and end:
-        query.append("   AND make_date(year, month, 1) BETWEEN make_date(%s, %s, 1) AND make_date(%s, %s, 1)")
-        params.extend([start[0], start[1], end[0], end[1]])
-    query.append(" GROUP BY year, month ORDER BY year, month")
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("\n".join(query), params)
-        return cur.fetchall()
+    shares: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for hs_code, label, partner, share in rows:
+        if share is not None:
+            shares.setdefault((hs_code, label), {})[partner] = float(share)
+    return shares
 
 
 def latest_year_month(conn) -> Optional[Tuple[int, int]]:
+    """Return the most recent ``(year, month)`` with imports."""
+
     with conn.cursor() as cur:
-        cur.execute("SELECT max(year), max(month) FROM monthly_imports")
+        cur.execute("SELECT year, month FROM monthly_imports ORDER BY year DESC, month DESC LIMIT 1")
         result = cur.fetchone()
-    if not result or result[0] is None or result[1] is None:
-        return None
-    return result[0], result[1]
+    return (result[0], result[1]) if result else None
 
 
 def upsert_domestic_capability(
@@ -373,7 +574,7 @@ def upsert_domestic_capability(
     notes,
     source,
 ) -> int:
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor() as cur:
         cur.execute(
             """
             INSERT INTO domestic_capability (hs_code, capex_min, capex_max, machines, skills, notes, source, verified, created_at)
@@ -399,11 +600,13 @@ def upsert_domestic_capability(
             ),
         )
         row = cur.fetchone()
-    return int(row["id"]) if row and row.get("id") is not None else 0
+    return int(row[0]) if row and row[0] is not None else 0
+
 
+def fetch_verified_capability(conn, hs_code: str) -> List[Tuple]:
+    """Return verified capability rows as named tuples, newest first."""
 
-def fetch_verified_capability(conn, hs_code: str) -> List[Dict]:
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor(cursor_factory=NamedTupleCursor) as cur:
         cur.execute(
             """
             SELECT id, hs_code, capex_min, capex_max, machines, skills, notes, source, verified
@@ -4,11 +4,21 @@ from __future__ import annotations
 import json
 import logging
 import os
-import time
+import random
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Tuple
+from sys import intern
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from urllib import error, parse, request
+from urllib import parse
+
+import urllib3
+
+try:  # orjson parses bytes directly and is much faster on large payloads
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency missing
+    orjson = None
 
 from .. import db, forex
 from . import normalize
@@ -17,8 +27,43 @@ LOGGER = logging.getLogger(__name__)
 
 MAX_RETRIES = 4
 RETRY_STATUS = {429, 500, 502, 503, 504}
+CONCURRENCY = max(1, int(os.getenv("COMTRADE_CONCURRENCY", "8")))
+PREFETCH_CHAPTERS = CONCURRENCY * 2
+
+class _JitteredRetry(urllib3.Retry):
+    """urllib3 Retry with full-jitter exponential backoff.
+
+    Concurrent chapter workers that hit a 429 together would otherwise retry in
+    lockstep. Each wait is drawn uniformly from ``[0, min(backoff_max,
+    backoff_factor * 2 ** attempt)]``. A server ``Retry-After`` header still
+    takes precedence (see ``Retry.sleep``).
+    """
+
+    def get_backoff_time(self) -> float:
+        attempt = len(self.history)
+        if not attempt:
+            return 0.0
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** attempt))
+
+# Shared keep-alive pool for the Comtrade API. Retries (with jittered
+# exponential backoff capped at 30s) are handled by urllib3.
+_HTTP = urllib3.PoolManager(
+    maxsize=CONCURRENCY,
+    timeout=urllib3.Timeout(total=45),
+    retries=_JitteredRetry(
+        total=MAX_RETRIES,
+        backoff_factor=1,
+        backoff_max=30,
+        status_forcelist=RETRY_STATUS,
+        raise_on_status=False,
+    ),
+)
+# Comtrade payloads are large, number-heavy JSON; gzip cuts them ~5-10x and
+# urllib3 decompresses transparently. Per-request headers replace pool
+# defaults in urllib3, so this is merged into every request explicitly.
+_DEFAULT_HEADERS = {"Accept-Encoding": "gzip"}
 
-@dataclass
+@dataclass(slots=True)
 class Record:
     hs_code: str
     title: str
@@ -46,44 +91,36 @@ def _resolve_endpoint() -> str:
         return base
     return f"{base}/data"
 
-def _request(params: Dict[str, str]) -> Dict:
+def _loads(payload: bytes) -> Dict:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload.decode("utf-8"))
+
+def _request(params: Dict[str, str], *, url_prefix: Optional[str] = None) -> Dict:
+    """GET the Comtrade /data endpoint and return the decoded JSON payload.
+
+    ``url_prefix`` lets callers pass a pre-encoded ``endpoint?static=params&``
+    so only the per-call ``params`` are urlencoded here.
+    """
     # Add subscription key if available
     key = os.getenv("COMTRADE_KEY")
+    headers = dict(_DEFAULT_HEADERS)
     if key:
         params["subscription-key"] = key
-    
-    query = parse.urlencode(params)
-    url = f"{_resolve_endpoint()}?{query}"
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            req = request.Request(url)
-            if key:
-                req.add_header("Ocp-Apim-Subscription-Key", key)
-            
-            with request.urlopen(req, timeout=45) as resp:
-                status = resp.status
-                if status in RETRY_STATUS:
-                    raise error.HTTPError(url, status, "retryable", hdrs=None, fp=None)
-                payload = resp.read()
-                return json.loads(payload.decode("utf-8"))
-        except error.HTTPError as exc:
-            body = ""
-            try:
-                body = exc.read().decode("utf-8")
-            except Exception:
-                body = ""
-            if exc.code in RETRY_STATUS and attempt < MAX_RETRIES:
-                LOGGER.warning("Comtrade HTTP %s (%s/%s); backing off", exc.code, attempt, MAX_RETRIES)
-                time.sleep(min(2 ** attempt, 30))
-                continue
-            detail = body or exc.reason or "Unknown HTTP error"
-            raise RuntimeError(f"Comtrade request failed ({exc.code}): {detail}") from exc
-        except error.URLError as exc:
-            LOGGER.warning("Comtrade request failed (%s/%s): %s", attempt, MAX_RETRIES, exc)
-            if attempt == MAX_RETRIES:
-                raise
-            time.sleep(min(2 ** attempt, 30))
-    raise RuntimeError("Comtrade API request failed after retries")
+        headers["Ocp-Apim-Subscription-Key"] = key
+
+    if url_prefix is None:
+        url_prefix = f"{_resolve_endpoint()}?"
+    url = url_prefix + parse.urlencode(params)
+    try:
+        resp = _HTTP.request("GET", url, headers=headers)
+    except urllib3.exceptions.HTTPError as exc:
+        LOGGER.warning("Comtrade request failed after %s attempts: %s", MAX_RETRIES, exc)
+        raise RuntimeError(f"Comtrade request failed: {exc}") from exc
+    if resp.status >= 400:
+        detail = resp.data.decode("utf-8", errors="replace") or resp.reason or "Unknown HTTP error"
+        raise RuntimeError(f"Comtrade request failed ({resp.status}): {detail}")
+    return _loads(resp.data)
 
 def _extract_dataset(payload: Dict) -> List[Dict]:
     data = payload.get("data", [])
@@ -92,55 +129,81 @@ def _extract_dataset(payload: Dict) -> List[Dict]:
     return []
 
 def _next_cursor(payload: Dict) -> Optional[str]:
-    links = payload.get("links", {})
+    links = payload.get("links")
+    if not links:
+        # Common case: Comtrade returns the whole result in one page.
+        return None
     if isinstance(links, dict):
         next_link = links.get("next")
         if isinstance(next_link, dict):
             next_link = next_link.get("href")
-        if isinstance(next_link, str) and "?" in next_link:
-            parsed = parse.urlparse(next_link)
-            cursor = dict(parse.parse_qsl(parsed.query)).get("cursor")
+        if isinstance(next_link, str) and "cursor=" in next_link:
+            cursor = dict(parse.parse_qsl(parse.urlsplit(next_link).query)).get("cursor")
             if cursor:
                 return cursor
     return None
 
+def _to_float(value) -> Optional[float]:
+    if value is None or isinstance(value, float):
+        return value
+    return float(value)
+
 def _parse_dataset(dataset: Iterable[Dict]) -> List[Record]:
+    canonical_hs_code = normalize.canonical_hs_code
+    infer_sectors = normalize.infer_sectors
+    ensure_usd = normalize.ensure_usd
+    to_float = _to_float
+    make_record = Record
     records: List[Record] = []
+    append = records.append
     for row in dataset:
-        hs_code = normalize.canonical_hs_code(row.get("cmdCode"))
+        get = row.get
+        hs_code = canonical_hs_code(get("cmdCode"))
         if not hs_code:
             continue
-        period = str(row.get("period") or "")
-        if len(period) != 6:
+        # Few distinct codes/partners across many rows: share one str object each.
+        hs_code = intern(hs_code)
+        period = get("period")
+        if not isinstance(period, int):
+            # The JSON decoder usually hands back YYYYMM as an int already.
+            try:
+                period = int(period)
+            except (TypeError, ValueError):
+                continue
+        if not 100001 <= period <= 999912:
+            continue
+        year, month = divmod(period, 100)
+        if not 1 <= month <= 12:
             continue
-        year, month = int(period[:4]), int(period[4:6])
-        title = (row.get("cmdDescE") or row.get("cmdDescription") or "").strip()
-        description = (row.get("mainCategory") or "").strip()
-        partner = row.get("pt3ISO") or row.get("ptTitle") or None
-        value_usd = float(row.get("TradeValue", 0)) if row.get("TradeValue") is not None else None
-        qty_raw = row.get("NetWeight") or row.get("primaryValue")
-        qty = float(qty_raw) if qty_raw is not None else None
-        sectors = normalize.infer_sectors(title, description)
-        records.append(
-            Record(
-                hs_code=hs_code,
-                title=title or f"HS {hs_code}",
-                description=description,
-                sectors=sectors,
-                capex_min=None,
-                capex_max=None,
-                year=year,
-                month=month,
-                value_usd=normalize.ensure_usd(value_usd),
-                value_inr=None,
-                qty=qty,
-                partner_country=partner,
+        title = (get("cmdDescE") or get("cmdDescription") or "").strip()
+        description = (get("mainCategory") or "").strip()
+        partner = get("pt3ISO") or get("ptTitle") or None
+        if partner is not None:
+            partner = intern(partner)
+        value_usd = to_float(get("TradeValue"))
+        if value_usd is not None:
+            value_usd = ensure_usd(value_usd)
+        qty = to_float(get("NetWeight") or get("primaryValue"))
+        append(
+            make_record(
+                hs_code,
+                title or f"HS {hs_code}",
+                description,
+                infer_sectors(title, description),
+                None,
+                None,
+                year,
+                month,
+                value_usd,
+                None,
+                qty,
+                partner,
             )
         )
     return records
 
-def _build_periods(from_period: str, to_period: str) -> List[str]:
-    """Generate comma-separated YYYYMM periods from inclusive YYYY-MM or YYYYMM inputs."""
+def _build_periods(from_period: str, to_period: str) -> Iterator[str]:
+    """Yield YYYYMM periods from inclusive YYYY-MM or YYYYMM inputs."""
     def parse_period(p: str) -> Tuple[int, int]:
         p = (p or "").strip()
         if "-" in p and len(p) >= 7:
@@ -150,24 +213,46 @@ def _build_periods(from_period: str, to_period: str) -> List[str]:
     from_y, from_m = parse_period(from_period)
     to_y, to_m = parse_period(to_period)
 
-    periods: List[str] = []
-    y, m = from_y, from_m
-    while y < to_y or (y == to_y and m <= to_m):
-        periods.append(f"{y:04d}{m:02d}")
-        m += 1
-        if m > 12:
-            m = 1
-            y += 1
-    return periods
+    # Walk a flat month index (year * 12 + month - 1) instead of carrying years.
+    for index in range(from_y * 12 + from_m - 1, to_y * 12 + to_m):
+        year, month0 = divmod(index, 12)
+        yield str(year * 100 + month0 + 1)
 
-def fetch_range(
+def _fetch_chapter(chapter: int, url_prefix: str) -> List[Record]:
+    """Fetch and parse every cursor page for one HS chapter."""
+    params = {"cmdCode": f"{chapter:02d}*"}  # Chapter wildcard (preview supports limited)
+
+    records: List[Record] = []
+    cursor = None
+    while True:
+        if cursor:
+            params["cursor"] = cursor
+        payload = _request(params, url_prefix=url_prefix)
+
+        if payload.get("statusCode") == 404:
+            LOGGER.debug("No data for HS chapter %02d", chapter)
+            break
+
+        # Parse each page as it arrives so only one page of raw JSON dicts is
+        # resident at a time; slotted Records are far smaller than the rows.
+        records.extend(_parse_dataset(_extract_dataset(payload)))
+        cursor = _next_cursor(payload)
+        del payload
+        if not cursor:
+            break
+
+    LOGGER.info("Fetched %d records for HS chapter %02d", len(records), chapter)
+    return records
+
+def _fetch_range_iter(
     from_period: str,
     to_period: str,
     *,
     reporter_code: Optional[str] = None,
     flow_code: Optional[str] = None,
     frequency: Optional[str] = None,
-) -> List[Record]:
+) -> Iterator[Record]:
+    """Yield records chapter by chapter as soon as each chapter is fetched."""
     reporter_code = reporter_code or os.getenv("COMTRADE_REPORTER", "356")  # India
     flow_code = flow_code or os.getenv("COMTRADE_FLOW", "1")  # Trade flow (1=Import, 2=Export)
     frequency = frequency or os.getenv("COMTRADE_FREQ", "M")
@@ -181,31 +266,45 @@ def fetch_range(
         "period": ",".join(_build_periods(from_period, to_period)),
     }
     
-    all_records = []
-    for chapter in range(1, 100):  # HS chapters 01-99
-        params = dict(base_params)
-        params["cmdCode"] = f"{chapter:02d}*"  # Chapter wildcard (preview supports limited)
-        
-        dataset = []
-        cursor = None
-        while True:
-            if cursor:
-                params["cursor"] = cursor
-            payload = _request(params)
-            
-            if payload.get("statusCode") == 404:
-                LOGGER.debug("No data for HS chapter %02d", chapter)
-                break
-            
-            dataset.extend(_extract_dataset(payload))
-            cursor = _next_cursor(payload)
-            if not cursor:
-                break
-        
-        records = _parse_dataset(dataset)
-        all_records.extend(records)
-        LOGGER.info("Fetched %d records for HS chapter %02d", len(records), chapter)
-    
+    # The static part of the query is identical for every chapter and page,
+    # so encode it once.
+    url_prefix = f"{_resolve_endpoint()}?{parse.urlencode(base_params)}&"
+    chapters = range(1, 100)  # HS chapters 01-99
+    # Chapters are independent and network-bound, so workers fetch ahead while
+    # the caller loads earlier chapters into the database. At most
+    # PREFETCH_CHAPTERS results are held at once, which keeps a slow database
+    # from letting fetched pages pile up in memory. Output stays in chapter order.
+    # On a failed chapter, or when the consumer stops early, queued chapters are
+    # cancelled and the error surfaces without waiting for in-flight requests.
+    executor = ThreadPoolExecutor(max_workers=CONCURRENCY)
+    try:
+        pending: Deque[Future] = deque()
+        for chapter in chapters:
+            pending.append(executor.submit(_fetch_chapter, chapter, url_prefix))
+            if len(pending) >= PREFETCH_CHAPTERS:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def fetch_range(
+    from_period: str,
+    to_period: str,
+    *,
+    reporter_code: Optional[str] = None,
+    flow_code: Optional[str] = None,
+    frequency: Optional[str] = None,
+) -> List[Record]:
+    all_records = list(
+        _fetch_range_iter(
+            from_period,
+            to_period,
+            reporter_code=reporter_code,
+            flow_code=flow_code,
+            frequency=frequency,
+        )
+    )
     LOGGER.info("Total fetched %s rows from Comtrade", len(all_records))
     return all_records
 
@@ -213,56 +312,63 @@ def load(
     conn,
     records: Iterable[Record],
 ) -> Tuple[int, int]:
-    products_seen: Dict[str, bool] = {}
-    monthly_rows = 0
-    for record in records:
-        products_seen.setdefault(record.hs_code, False)
-        if not products_seen[record.hs_code]:
-            db.upsert_product(
-                conn,
-                hs_code=record.hs_code,
-                title=record.title,
-                description=record.description,
-                sectors=record.sectors,
-                capex_min=record.capex_min,
-                capex_max=record.capex_max,
-            )
-            products_seen[record.hs_code] = True
-        fx_rate: Optional[float]
-        try:
-            fx_rate = forex.monthly_rate(record.year, record.month)
-        except RuntimeError:
-            LOGGER.warning(
-                "Missing FX rate for %s %s-%02d; storing without INR conversion",
+    """Upsert products and monthly rows, consuming ``records`` in a single pass."""
+    products: Dict[str, Tuple] = {}
+    # A load spans only a handful of months, so resolve each FX rate once.
+    fx_cache: Dict[Tuple[int, int], Optional[float]] = {}
+
+    def monthly_rows() -> Iterable[Tuple]:
+        for record in records:
+            if record.hs_code not in products:
+                products[record.hs_code] = (
+                    record.hs_code,
+                    record.title,
+                    record.description,
+                    record.sectors,
+                    record.capex_min,
+                    record.capex_max,
+                )
+            key = (record.year, record.month)
+            if key in fx_cache:
+                fx_rate = fx_cache[key]
+            else:
+                try:
+                    fx_rate = forex.monthly_rate(record.year, record.month)
+                except RuntimeError:
+                    LOGGER.warning(
+                        "Missing FX rate for %s-%02d; storing without INR conversion",
+                        record.year,
+                        record.month,
+                    )
+                    fx_rate = None
+                fx_cache[key] = fx_rate
+
+            value_usd = record.value_usd
+            value_inr = record.value_inr
+            if value_usd is None and value_inr is None:
+                LOGGER.debug("Skipping record %s due to missing monetary values", record)
+                continue
+            if fx_rate is not None and value_inr is None and value_usd is not None:
+                value_inr = value_usd * fx_rate
+            if fx_rate is not None and value_usd is None and value_inr is not None:
+                value_usd = value_inr / fx_rate
+
+            yield (
                 record.hs_code,
                 record.year,
                 record.month,
+                value_usd,
+                value_inr,
+                fx_rate,
+                record.qty,
+                record.partner_country,
             )
-            fx_rate = None
+        # Runs once the input is drained, i.e. after the rows are staged but
+        # before copy_monthly merges them, so the products foreign key holds.
+        db.bulk_upsert_products(conn, products.values())
 
-        value_usd = record.value_usd
-        value_inr = record.value_inr
-        if value_usd is None and value_inr is None:
-            LOGGER.debug("Skipping record %s due to missing monetary values", record)
-            continue
-        if fx_rate is not None and value_inr is None and value_usd is not None:
-            value_inr = value_usd * fx_rate
-        if fx_rate is not None and value_usd is None and value_inr is not None:
-            value_usd = value_inr / fx_rate
-
-        db.insert_monthly(
-            conn,
-            hs_code=record.hs_code,
-            year=record.year,
-            month=record.month,
-            value_usd=value_usd,
-            value_inr=value_inr,
-            fx_rate=fx_rate,
-            qty=record.qty,
-            partner=record.partner_country,
-        )
-        monthly_rows += 1
-    return len(products_seen), monthly_rows
+    inserted = db.copy_monthly(conn, monthly_rows(), bulk_load=True)
+    return len(products), inserted
 
 def run(
     conn,
@@ -270,11 +376,10 @@ def run(
     from_period: str,
     to_period: str,
 ) -> Dict[str, object]:
-    records = fetch_range(from_period, to_period)
-    if not records:
+    products, monthly_rows = load(conn, _fetch_range_iter(from_period, to_period))
+    if not products:
         raise RuntimeError("Comtrade returned no records for the requested range")
-
-    products, monthly_rows = load(conn, records)
+    LOGGER.info("Loaded %s Comtrade rows for %s products", monthly_rows, products)
     return {
         "products_upserted": products,
         "monthly_imports_upserted": monthly_rows,
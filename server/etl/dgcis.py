@@ -5,7 +5,7 @@ import csv
 import logging
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from .. import db, forex
 from . import normalize
@@ -13,7 +13,7 @@ from . import normalize
 LOGGER = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class Record:
     hs_code: str
     title: str
@@ -36,41 +36,74 @@ REQUIRED_COLUMNS = {
 }
 
 
-def _read_csv(path: Path) -> Iterable[dict]:
-    with path.open("r", encoding="utf-8") as handle:
-        reader = csv.DictReader(handle)
-        missing = REQUIRED_COLUMNS - set(reader.fieldnames or [])
-        if missing:
-            raise RuntimeError(f"DGCI&S file missing required columns: {', '.join(sorted(missing))}")
-        yield from reader
+# Column order of the tuples yielded by _read_csv and unpacked by _parse_row.
+_FIELDS = (
+    "hs_code",
+    "year",
+    "month",
+    "value_inr",
+    "value_usd",
+    "qty",
+    "partner_country",
+    "title",
+    "description",
+    "sectors",
+)
 
 
-def _parse_row(row: dict) -> Optional[Record]:
-    hs_code = normalize.canonical_hs_code(row.get("hs_code"))
+def _to_float(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_csv(path: Path) -> Iterator[Tuple[Optional[str], ...]]:
+    """Yield each data row as a tuple ordered like ``_FIELDS``.
+
+    Rows are read with ``csv.reader`` and projected by column index (see
+    :func:`normalize.project_csv_rows`), which avoids building a dict per row.
+    """
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        reader = csv.reader(handle)
+        header = next(reader, [])
+        missing = REQUIRED_COLUMNS - set(header)
+        if missing:
+            raise RuntimeError(f"DGCI&S file missing required columns: {', '.join(sorted(missing))}")
+        yield from normalize.project_csv_rows(reader, header, _FIELDS)
+
+
+def _parse_row(row: Tuple[Optional[str], ...]) -> Optional[Record]:
+    (
+        raw_hs_code,
+        raw_year,
+        raw_month,
+        raw_value_inr,
+        raw_value_usd,
+        raw_qty,
+        partner,
+        title,
+        description,
+        raw_sectors,
+    ) = row
+    hs_code = normalize.canonical_hs_code(raw_hs_code)
     if not hs_code:
         return None
     try:
-        year = int(row["year"])
-        month = int(row["month"])
+        year = int(raw_year)
+        month = int(raw_month)
     except (TypeError, ValueError):
         return None
 
-    def _to_float(key: str) -> Optional[float]:
-        value = row.get(key)
-        if value in (None, ""):
-            return None
-        try:
-            return float(value)
-        except (TypeError, ValueError):
-            return None
-
-    value_inr = _to_float("value_inr")
-    value_usd = _to_float("value_usd")
-    qty = _to_float("qty")
-    partner = row.get("partner_country") or None
-    title = (row.get("title") or "").strip()
-    description = (row.get("description") or "").strip()
-    sectors = normalize.parse_csv_sectors(row.get("sectors", "")) or normalize.infer_sectors(title, description)
+    value_inr = _to_float(raw_value_inr)
+    value_usd = _to_float(raw_value_usd)
+    qty = _to_float(raw_qty)
+    partner = partner or None
+    title = (title or "").strip()
+    description = (description or "").strip()
+    sectors = normalize.parse_csv_sectors(raw_sectors or "") or normalize.infer_sectors(title, description)
 
     try:
         fx_rate = forex.monthly_rate(year, month)
@@ -100,13 +133,17 @@ def _parse_row(row: dict) -> Optional[Record]:
     )
 
 
-def load_csv(path: Path) -> List[Record]:
-    records: List[Record] = []
+def iter_records(path: Path) -> Iterator[Record]:
+    """Yield valid records from a DGCI&S export, skipping unparseable rows."""
+    parse_row = _parse_row
     for raw in _read_csv(path):
-        record = _parse_row(raw)
-        if record is None:
-            continue
-        records.append(record)
+        record = parse_row(raw)
+        if record is not None:
+            yield record
+
+
+def load_csv(path: Path) -> List[Record]:
+    records = list(iter_records(path))
     if not records:
         raise RuntimeError(f"DGCI&S file {path} did not yield any valid rows")
     LOGGER.info("Parsed %s DGCI&S records from %s", len(records), path)
@@ -114,44 +151,50 @@ def load_csv(path: Path) -> List[Record]:
 
 
 def load(conn, records: Iterable[Record]) -> Tuple[int, int]:
-    products_seen: dict[str, bool] = {}
-    monthly_rows = 0
-    for record in records:
-        if record.value_usd is None or record.value_inr is None or record.fx_rate is None:
-            raise RuntimeError(
-                f"Incomplete monetary data for {record.hs_code} {record.year}-{record.month:02d}"
+    """Upsert products and monthly rows in bulk, consuming ``records`` once."""
+    products: Dict[str, Tuple] = {}
+
+    def monthly_rows() -> Iterator[Tuple]:
+        for record in records:
+            if record.value_usd is None or record.value_inr is None or record.fx_rate is None:
+                raise RuntimeError(
+                    f"Incomplete monetary data for {record.hs_code} {record.year}-{record.month:02d}"
+                )
+            if record.hs_code not in products:
+                products[record.hs_code] = (
+                    record.hs_code,
+                    record.title,
+                    record.description,
+                    record.sectors,
+                    None,
+                    None,
+                )
+            yield (
+                record.hs_code,
+                record.year,
+                record.month,
+                record.value_usd,
+                record.value_inr,
+                record.fx_rate,
+                record.qty,
+                record.partner_country,
             )
-        if record.hs_code not in products_seen:
-            db.upsert_product(
-                conn,
-                hs_code=record.hs_code,
-                title=record.title,
-                description=record.description,
-                sectors=record.sectors,
-                capex_min=None,
-                capex_max=None,
-            )
-            products_seen[record.hs_code] = True
-        db.insert_monthly(
-            conn,
-            hs_code=record.hs_code,
-            year=record.year,
-            month=record.month,
-            value_usd=record.value_usd,
-            value_inr=record.value_inr,
-            fx_rate=record.fx_rate,
-            qty=record.qty,
-            partner=record.partner_country,
-        )
-        monthly_rows += 1
-    return len(products_seen), monthly_rows
+        # Products must exist before copy_monthly merges the staged rows.
+        db.bulk_upsert_products(conn, products.values())
+
+    inserted = db.copy_monthly(conn, monthly_rows(), bulk_load=True)
+    return len(products), inserted
 
 
 def run(conn, *, source: Path) -> dict:
     if not source.exists():
         raise RuntimeError(f"DGCI&S source file not found: {source}")
-    records = load_csv(source)
-    products, monthly_rows = load(conn, records)
+    # Rows stream from the CSV reader straight into COPY; the export is never
+    # held in memory as a list of records.
+    products, monthly_rows = load(conn, iter_records(source))
+    if not monthly_rows:
+        raise RuntimeError(f"DGCI&S file {source} did not yield any valid rows")
+    LOGGER.info("Loaded %s DGCI&S rows for %s products from %s", monthly_rows, products, source)
     return {
         "products": products,
         "monthly_rows": monthly_rows,
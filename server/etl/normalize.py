@@ -2,7 +2,9 @@
 from __future__ import annotations
 
 import re
-from typing import Iterable, List, Optional, Sequence
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 HS_PATTERN = re.compile(r"\d+")
 
@@ -28,6 +30,18 @@ _SECTOR_KEYWORDS = {
     "instruments": ["analyzer", "instrument", "meter", "sensor"],
 }
 
+_KEYWORD_SECTORS: Dict[str, Tuple[str, ...]] = {
+    keyword: tuple(sector for sector, words in _SECTOR_KEYWORDS.items() if keyword in words)
+    for keywords in _SECTOR_KEYWORDS.values()
+    for keyword in keywords
+}
+
+# Keywords match as plain substrings; the lookahead lets overlapping keywords
+# all register in a single scan of the text.
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(keyword) for keyword in sorted(_KEYWORD_SECTORS, key=len, reverse=True)) + "))"
+)
+
 
 def infer_sectors(*text_blocks: Sequence[str]) -> List[str]:
     """Return a deduplicated sector list based on keyword heuristics."""
@@ -40,14 +54,19 @@ def infer_sectors(*text_blocks: Sequence[str]) -> List[str]:
             snippets.extend(str(item) for item in block if item)
         else:
             snippets.append(str(block))
-    haystack = " ".join(snippets).lower()
-    sectors: List[str] = []
-    for sector, keywords in _SECTOR_KEYWORDS.items():
-        if any(keyword in haystack for keyword in keywords):
-            sectors.append(sector)
-    if not sectors:
-        sectors.append("industrial")
-    return sectors
+    return list(_sectors_for_text(" ".join(snippets).lower()))
+
+
+@lru_cache(maxsize=65536)
+def _sectors_for_text(haystack: str) -> Tuple[str, ...]:
+    # Product titles repeat across partners and months, so most lookups are
+    # cache hits keyed on the normalised text.
+    if not haystack.strip():
+        return ("industrial",)
+    hits = set()
+    for keyword in set(_KEYWORD_RE.findall(haystack)):
+        hits.update(_KEYWORD_SECTORS[keyword])
+    return tuple(sector for sector in _SECTOR_KEYWORDS if sector in hits) or ("industrial",)
 
 
 def parse_csv_sectors(raw: str) -> List[str]:
@@ -59,6 +78,33 @@ def parse_csv_sectors(raw: str) -> List[str]:
     return [segment.strip() for segment in cleaned.split(",") if segment.strip()]
 
 
+def project_csv_rows(
+    rows: Iterable[List[str]],
+    header: Sequence[str],
+    fields: Sequence[str],
+) -> Iterator[Tuple[Optional[str], ...]]:
+    """Yield ``csv.reader`` rows as tuples ordered like ``fields``.
+
+    Rows are projected by header index rather than through a dict. Fields absent
+    from the header, and cells missing from short rows, come back as ``None``;
+    cells beyond the header are ignored and blank lines are skipped.
+    """
+
+    index = {name: position for position, name in enumerate(header)}
+    width = len(header)
+    # Absent fields point at a trailing None appended to every row.
+    project = itemgetter(*(index.get(name, width) for name in fields))
+    for row in rows:
+        if not row:
+            continue
+        if len(row) < width:
+            row.extend([None] * (width - len(row)))
+        else:
+            del row[width:]
+        row.append(None)
+        yield project(row)
+
+
 def ensure_usd(value: Optional[float]) -> Optional[float]:
     """Placeholder for currency conversion when data already in USD."""
 
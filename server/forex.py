@@ -5,20 +5,25 @@ import csv
 import os
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
 LOGGER_NAME = "buildforindia.forex"
+DEFAULT_RATES_FILE = "data/fx_rates.csv"
 
 
-def _rates_file() -> Path:
-    path = Path(os.getenv("FX_RATES_FILE", "data/fx_rates.csv"))
+def _rates_file(setting: str) -> Path:
+    path = Path(setting)
     if not path.exists():
         raise RuntimeError(f"FX rates file not found: {path}")
     return path
 
 
 @lru_cache(maxsize=8)
-def _load_rates(resolved_path: str) -> Dict[Tuple[int, int], float]:
+def _load_rates(resolved_path: str, mtime_ns: int) -> Dict[Tuple[int, int], float]:
+    """Parse the rates table; ``mtime_ns`` is only part of the cache key."""
+
+    # A new file revision invalidates every memoised month, hits and misses.
+    _rate_for.cache_clear()
     table: Dict[Tuple[int, int], float] = {}
     with Path(resolved_path).open("r", encoding="utf-8") as handle:
         reader = csv.DictReader(handle)
@@ -39,20 +44,39 @@ def _load_rates(resolved_path: str) -> Dict[Tuple[int, int], float]:
     return table
 
 
+@lru_cache(maxsize=2048)
+def _rate_for(setting: str, year: int, month: int) -> Optional[float]:
+    """Return the rate for a month, or ``None`` when the file has no such row.
+
+    Misses are memoised like hits, so rows for an uncovered month do not
+    re-stat the rates file. Loading an edited file (keyed on its mtime) clears
+    this memo, so both are refreshed together.
+    """
+
+    path = _rates_file(setting).resolve()
+    rates = _load_rates(str(path), path.stat().st_mtime_ns)
+    return rates.get((year, month))
+
+
 def monthly_rate(year: int, month: int) -> float:
     """Return the USD → INR rate for the given year/month."""
 
     if not (1 <= int(month) <= 12):
         raise RuntimeError(f"Invalid month for FX rate: {month}")
-    resolved = str(_rates_file().resolve())
-    rates = _load_rates(resolved)
-    key = (int(year), int(month))
-    if key not in rates:
-        raise RuntimeError(f"FX rate missing for {year}-{int(month):02d}")
-    return rates[key]
+    # Memoised per (file setting, month) so hot ETL loops skip the path
+    # resolution and stat that locating the rates file costs.
+    rate = _rate_for(os.getenv("FX_RATES_FILE", DEFAULT_RATES_FILE), int(year), int(month))
+    if rate is None:
+        raise RuntimeError(f"FX rate missing for {int(year)}-{int(month):02d}")
+    return rate
 
 
 def reset_cache() -> None:
-    """Clear cached FX data (useful for tests)."""
+    """Clear cached FX data (useful for tests).
+
+    An edited file is otherwise picked up on the next lookup of a month that
+    has not been memoised yet.
+    """
 
+    _rate_for.cache_clear()
     _load_rates.cache_clear()
@@ -2,10 +2,12 @@
 from __future__ import annotations
 
 import logging
+import math
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
-
-from psycopg2.extras import RealDictCursor
+from datetime import date
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from . import db, util
 
@@ -19,86 +21,145 @@ class MonthlyTotal:
     total: float
 
 
-def _next_month(year: int, month: int) -> Tuple[int, int]:
-    if month == 12:
-        return year + 1, 1
-    return year, month + 1
-
-
-def _fill_missing_months(monthly: List[MonthlyTotal]) -> List[MonthlyTotal]:
-    """Return a contiguous series, inserting zero totals for gaps."""
+@dataclass
+class ProductSeries:
+    hs_code: str
+    sectors: List[str]
+    baseline: Optional[float]
+    baseline_start: Optional[date]
+    baseline_end: Optional[date]
+    monthly: List[MonthlyTotal]
 
-    if not monthly:
-        return []
 
-    totals = {(row.year, row.month): float(row.total) for row in monthly}
-    start_year, start_month = monthly[0].year, monthly[0].month
-    end_year, end_month = monthly[-1].year, monthly[-1].month
+def _month_index(year: int, month: int) -> int:
+    """Map a year/month to a running month count so gaps are plain subtraction."""
 
-    filled: List[MonthlyTotal] = []
-    year, month = start_year, start_month
-    while True:
-        filled.append(MonthlyTotal(year, month, totals.get((year, month), 0.0)))
-        if (year, month) == (end_year, end_month):
-            break
-        year, month = _next_month(year, month)
-    return filled
+    return year * 12 + month - 1
 
 
 def _window_of_12(monthly: List[MonthlyTotal], *, latest: bool = False) -> Optional[List[MonthlyTotal]]:
-    filled = _fill_missing_months(monthly)
-    if len(filled) < 12:
-        return None
-    if latest:
-        return filled[-12:]
-    return filled[:12]
+    """Return the earliest (or latest) 12 months of the series, zero-filling gaps."""
 
-
-def _monthly_totals(conn, hs_code: str) -> List[MonthlyTotal]:
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    if not monthly:
+        return None
+    first = _month_index(monthly[0].year, monthly[0].month)
+    last = _month_index(monthly[-1].year, monthly[-1].month)
+    if last - first + 1 < 12:
+        return None
+    # Only the 12 months of the chosen window are materialised, however long
+    # the product's history is.
+    start = last - 11 if latest else first
+    totals = {_month_index(row.year, row.month): float(row.total) for row in monthly}
+    return [
+        MonthlyTotal(index // 12, index % 12 + 1, totals.get(index, 0.0))
+        for index in range(start, start + 12)
+    ]
+
+
+def _iter_product_series(conn) -> Iterator[ProductSeries]:
+    """Yield every product with its stored baseline and monthly totals, in code order.
+
+    Products, their baseline row and their grouped monthly totals come from
+    one query over a server-side cursor, and only the current product's
+    months are held in memory. Products without imports get an empty series.
+    """
+
+    with conn.cursor(name="product_series") as cur:
+        cur.itersize = 5000
         cur.execute(
             """
-            SELECT year, month, SUM(value_usd) AS total
-            FROM monthly_imports
-            WHERE hs_code = %s
-            GROUP BY year, month
-            ORDER BY year, month
-            """,
-            (hs_code,),
+            SELECT p.hs_code, p.sectors, b.baseline_12m_usd, b.baseline_start, b.baseline_end,
+                   m.year, m.month, m.total
+            FROM products p
+            LEFT JOIN baseline_imports b ON b.hs_code = p.hs_code
+            LEFT JOIN (
+                SELECT hs_code, year, month, SUM(value_usd) AS total
+                FROM monthly_imports
+                GROUP BY hs_code, year, month
+            ) m ON m.hs_code = p.hs_code
+            ORDER BY p.hs_code, m.year, m.month
+            """
         )
-        rows = cur.fetchall()
-    return [MonthlyTotal(int(row["year"]), int(row["month"]), float(row["total"] or 0)) for row in rows]
+        for hs_code, group in groupby(cur, key=itemgetter(0)):
+            rows = list(group)
+            _, sectors, baseline, baseline_start, baseline_end = rows[0][:5]
+            yield ProductSeries(
+                hs_code=hs_code,
+                sectors=sectors or [],
+                baseline=float(baseline) if baseline is not None else None,
+                baseline_start=baseline_start,
+                baseline_end=baseline_end,
+                monthly=[
+                    MonthlyTotal(int(year), int(month), float(total or 0))
+                    for *_, year, month, total in rows
+                    if year is not None
+                ],
+            )
+
+
+# The earliest 12-month window starts at each product's first month with data;
+# months without rows count as zero, matching _window_of_12. Months are mapped
+# to year * 12 + month - 1 so window bounds are integer arithmetic.
+_RECOMPUTE_BASELINE_SQL = """
+WITH monthly AS (
+    SELECT hs_code,
+           year * 12 + month - 1 AS idx,
+           SUM(value_usd) AS total,
+           MIN(year * 12 + month - 1) OVER (PARTITION BY hs_code) AS first_idx
+    FROM monthly_imports
+    GROUP BY hs_code, year, month
+),
+windows AS (
+    SELECT hs_code,
+           MAX(idx) - first_idx >= 11 AS sufficient,
+           make_date(first_idx / 12, first_idx % 12 + 1, 1) AS start_month,
+           make_date((first_idx + 11) / 12, (first_idx + 11) % 12 + 1, 1) AS end_month,
+           COALESCE(SUM(total) FILTER (WHERE idx < first_idx + 12), 0) AS baseline_value
+    FROM monthly
+    GROUP BY hs_code, first_idx
+),
+upserted AS (
+    INSERT INTO baseline_imports (
+        hs_code, baseline_12m_usd, baseline_period, baseline_start, baseline_end, updated_at
+    )
+    SELECT p.hs_code,
+           CASE WHEN w.sufficient THEN w.baseline_value END,
+           CASE
+               WHEN w.sufficient THEN
+                   to_char(w.start_month, 'YYYY-MM') || '_to_' || to_char(w.end_month, 'YYYY-MM')
+               ELSE 'insufficient_data'
+           END,
+           CASE WHEN w.sufficient THEN w.start_month END,
+           CASE WHEN w.sufficient THEN w.end_month END,
+           now()
+    FROM products p
+    LEFT JOIN windows w ON w.hs_code = p.hs_code
+    ON CONFLICT (hs_code) DO UPDATE
+      SET baseline_12m_usd = EXCLUDED.baseline_12m_usd,
+          baseline_period = EXCLUDED.baseline_period,
+          baseline_start = EXCLUDED.baseline_start,
+          baseline_end = EXCLUDED.baseline_end,
+          updated_at = EXCLUDED.updated_at
+    RETURNING baseline_12m_usd
+)
+SELECT COUNT(*), COUNT(baseline_12m_usd) FROM upserted
+"""
 
 
 def recompute_baseline(conn=None) -> Dict[str, int]:
-    """Populate baseline_imports with the earliest contiguous 12-month window."""
+    """Populate baseline_imports with the earliest contiguous 12-month window.
+
+    The whole recompute runs as one ``INSERT ... SELECT`` inside Postgres.
+    """
 
     own_connection = conn is None
     if own_connection:
         with db.connect() as managed:
             return recompute_baseline(managed)
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT hs_code FROM products ORDER BY hs_code")
-        products = [row["hs_code"] for row in cur.fetchall()]
-
-    processed = 0
-    with_baseline = 0
-    for code in products:
-        monthly = _monthly_totals(conn, code)
-        window = _window_of_12(monthly)
-        if not window:
-            db.upsert_baseline(conn, hs_code=code, baseline_value=None, baseline_period="insufficient_data")
-            processed += 1
-            continue
-
-        baseline_value = sum(item.total for item in window)
-        start = window[0]
-        end = window[-1]
-        baseline_period = f"{start.year:04d}-{start.month:02d}_to_{end.year:04d}-{end.month:02d}"
-        db.upsert_baseline(conn, hs_code=code, baseline_value=baseline_value, baseline_period=baseline_period)
-        processed += 1
-        with_baseline += 1
+    with conn.cursor() as cur:
+        cur.execute(_RECOMPUTE_BASELINE_SQL)
+        processed, with_baseline = cur.fetchone()
 
     LOGGER.info("Baseline recompute complete: %s processed, %s with baseline", processed, with_baseline)
     return {"processed": processed, "with_baseline": with_baseline}
@@ -112,29 +173,18 @@ def recompute_progress(conn=None) -> Dict[str, int]:
         with db.connect() as managed:
             return recompute_progress(managed)
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT hs_code, sectors FROM products ORDER BY hs_code")
-        products = cur.fetchall()
-
-    baseline_map: Dict[str, Dict[str, Optional[float]]] = {}
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT hs_code, baseline_12m_usd, baseline_period FROM baseline_imports")
-        for row in cur.fetchall():
-            baseline_map[row["hs_code"]] = {
-                "baseline": float(row["baseline_12m_usd"]) if row["baseline_12m_usd"] is not None else None,
-                "period": row.get("baseline_period"),
-            }
-
-    current_totals: Dict[str, float] = {}
+    log_totals: Dict[str, float] = {}
     metrics: Dict[str, Dict[str, Optional[float]]] = {}
+    share_windows: List[Tuple[str, str, Tuple[int, int], Tuple[int, int]]] = []
 
-    for row in products:
-        hs_code = row["hs_code"]
-        sectors = row.get("sectors") or []
-        monthly = _monthly_totals(conn, hs_code)
-        window = _window_of_12(monthly, latest=True)
+    for product in _iter_product_series(conn):
+        hs_code = product.hs_code
+        sectors = product.sectors
+        baseline_value = product.baseline
+        window = _window_of_12(product.monthly, latest=True)
         if not window:
             metrics[hs_code] = {
+                "baseline": baseline_value,
                 "current": None,
                 "reduction_abs": None,
                 "reduction_pct": None,
@@ -147,69 +197,69 @@ def recompute_progress(conn=None) -> Dict[str, int]:
             continue
 
         current_total = sum(item.total for item in window)
-        current_totals[hs_code] = current_total
+        log_totals[hs_code] = math.log1p(current_total)
         start = window[0]
         end = window[-1]
-        baseline_info = baseline_map.get(hs_code, {})
-        baseline_value = baseline_info.get("baseline")
         reduction_abs = (baseline_value - current_total) if baseline_value is not None else None
         if baseline_value in (None, 0) or reduction_abs is None:
             reduction_pct = None
         else:
             reduction_pct = reduction_abs / baseline_value
 
-        period_str = baseline_info.get("period")
-        hhi_baseline = None
-        if period_str and "_to_" in period_str:
-            start_str, end_str = period_str.split("_to_")
-            b_start = (int(start_str[:4]), int(start_str[5:7]))
-            b_end = (int(end_str[:4]), int(end_str[5:7]))
-            shares = db.partner_shares(conn, hs_code, start=b_start, end=b_end).values()
-            hhi_baseline = util.hhi_from_shares(list(shares))
-
-        current_shares = db.partner_shares(conn, hs_code, start=(start.year, start.month), end=(end.year, end.month))
-        hhi_current = util.hhi_from_shares(list(current_shares.values()))
-        concentration_shift = None
-        if hhi_baseline is not None or hhi_current is not None:
-            concentration_shift = (hhi_baseline or 0.0) - (hhi_current or 0.0)
+        b_start = product.baseline_start
+        b_end = product.baseline_end
+        if b_start is not None and b_end is not None:
+            share_windows.append((hs_code, "baseline", (b_start.year, b_start.month), (b_end.year, b_end.month)))
+        share_windows.append((hs_code, "current", (start.year, start.month), (end.year, end.month)))
 
         metrics[hs_code] = {
+            "baseline": baseline_value,
             "current": current_total,
             "reduction_abs": reduction_abs,
             "reduction_pct": reduction_pct,
-            "hhi_current": hhi_current,
-            "hhi_baseline": hhi_baseline,
-            "concentration_shift": concentration_shift,
+            "hhi_current": None,
+            "hhi_baseline": None,
+            "concentration_shift": None,
             "opportunity_score": None,
             "sectors": sectors,
         }
 
-    norm = util.norm_log({code: value for code, value in current_totals.items()})
+    # Import values are log1p-scaled to 0..1 across products, as util.norm_log
+    # does; the bounds are known once every current total has been seen.
+    log_min = min(log_totals.values(), default=0.0)
+    log_span = max(log_totals.values(), default=0.0) - log_min
 
+    shares = db.partner_shares_many(conn, share_windows)
+    tech_feasibility_for = util.tech_feasibility_for
+    rows: List[Tuple] = []
     for hs_code, metric in metrics.items():
         current_value = metric["current"]
-        if current_value is None:
-            opportunity = None
-        else:
-            tech_score = util.tech_feasibility_for(metric.get("sectors"))
-            import_value = norm.get(hs_code, 0.0)
-            hhi_current = metric["hhi_current"] or 0.0
-            opportunity = import_value * (1 - hhi_current) * tech_score * 1.0
-        metric["opportunity_score"] = opportunity
-
-        baseline_info = baseline_map.get(hs_code, {})
-        db.upsert_progress(
-            conn,
-            hs_code=hs_code,
-            baseline_value=baseline_info.get("baseline"),
-            current_value=current_value,
-            reduction_abs=metric["reduction_abs"],
-            reduction_pct=metric["reduction_pct"],
-            hhi_baseline=metric["hhi_baseline"],
-            hhi_current=metric["hhi_current"],
-            concentration_shift=metric["concentration_shift"],
-            opportunity_score=metric["opportunity_score"],
+        if current_value is not None:
+            hhi_baseline = util.hhi_from_shares(shares.get((hs_code, "baseline"), {}).values())
+            hhi_current = util.hhi_from_shares(shares.get((hs_code, "current"), {}).values())
+            metric["hhi_baseline"] = hhi_baseline
+            metric["hhi_current"] = hhi_current
+            if hhi_baseline is not None or hhi_current is not None:
+                metric["concentration_shift"] = (hhi_baseline or 0.0) - (hhi_current or 0.0)
+            import_value = (log_totals[hs_code] - log_min) / log_span if log_span else 0.0
+            tech_score = tech_feasibility_for(metric["sectors"])
+            metric["opportunity_score"] = import_value * (1 - (hhi_current or 0.0)) * tech_score
+
+        rows.append(
+            (
+                hs_code,
+                metric["baseline"],
+                current_value,
+                metric["reduction_abs"],
+                metric["reduction_pct"],
+                metric["hhi_baseline"],
+                metric["hhi_current"],
+                metric["concentration_shift"],
+                metric["opportunity_score"],
+            )
         )
 
+    db.bulk_upsert_progress(conn, rows)
+
     LOGGER.info("Progress recompute complete for %s products", len(metrics))
     return {"processed": len(metrics)}
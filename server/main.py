@@ -1,13 +1,19 @@
 """FastAPI entrypoint for Build for India."""
 from __future__ import annotations
 
+import asyncio
 import csv
+import functools
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Annotated
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Annotated
 
+import anyio.to_thread
 from dotenv import load_dotenv
 from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
@@ -48,10 +54,67 @@ except RuntimeError as exc:  # pragma: no cover - optional dependency missing
 
 SEED_CSV_PATH = BASE_DIR / "data" / "top100_hs.csv"
 
+# (path, st_mtime_ns) -> parsed seed rows; re-read only when the file changes.
+_SEED_CACHE: Optional[Tuple[Tuple[str, int], List[Dict[str, Any]]]] = None
+_SEED_CACHE_LOCK = threading.Lock()
+_SEED_FIELDS = (
+    "hs_code",
+    "title",
+    "description",
+    "sectors",
+    "capex_min",
+    "capex_max",
+    "seed_month_value",
+    "top_country",
+)
+
 DEFAULT_SOURCE = "database"
 ADMIN_SOURCE = "admin"
 MANUAL_SOURCE = "manual"
 
+_SORT_MAP = {
+    "opportunity": "COALESCE(ip.opportunity_score, 0) DESC",
+    "progress": "COALESCE(ip.reduction_pct, 0) DESC",
+    "value": "COALESCE(ip.current_12m_usd, 0) DESC",
+}
+_COMBINE_MODES = frozenset({"AND", "OR"})
+
+# Only trusted fragments (the WHERE built from fixed conditions and a
+# _SORT_MAP value) are formatted in; user input always travels as params.
+_PRODUCTS_SQL = """
+SELECT p.hs_code, p.title, p.description, p.sectors, p.capex_min, p.capex_max,
+       ip.current_12m_usd, ip.reduction_pct, ip.opportunity_score, ip.last_updated,
+       MAX(ip.last_updated) OVER () AS global_last_updated
+FROM products p
+LEFT JOIN import_progress ip ON ip.hs_code = p.hs_code
+{where}
+ORDER BY {order}
+LIMIT %s
+"""
+
+# Product, progress, baseline and activity JSON in a single round-trip.
+_PRODUCT_DETAIL_SQL = f"""
+SELECT p.hs_code, p.title, p.description, p.sectors, p.capex_min, p.capex_max,
+       ip.current_12m_usd, ip.reduction_pct, ip.opportunity_score, ip.last_updated,
+       ip.reduction_abs, ip.hhi_current, ip.hhi_baseline, ip.concentration_shift,
+       b.baseline_period, b.baseline_12m_usd, b.updated_at,
+       {db.PRODUCT_ACTIVITY_COLUMNS}
+FROM products p
+LEFT JOIN import_progress ip ON ip.hs_code = p.hs_code
+LEFT JOIN baseline_imports b ON b.hs_code = p.hs_code
+WHERE p.hs_code = %(hs_code)s
+"""
+
+_LEADERBOARD_SQL = """
+SELECT p.hs_code, p.title, p.sectors,
+       ip.current_12m_usd, ip.reduction_pct, ip.opportunity_score, ip.last_updated,
+       MAX(ip.last_updated) OVER () AS global_last_updated
+FROM products p
+LEFT JOIN import_progress ip ON ip.hs_code = p.hs_code
+ORDER BY {order}
+LIMIT %s
+"""
+
 
 def admin_guard(request: Request) -> None:
     """Dependency to guard admin endpoints (supports header or ?key=)."""
@@ -87,7 +150,70 @@ def _require_database_url() -> str:
     if not url:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="DATABASE_URL not configured")
     return url
-def _read_seed_rows() -> List[Dict[str, str]]:
+# Set once the schema DDL has committed in this process. A startup background
+# task normally does it; the seed endpoint repeats it only when that task has
+# not finished or could not reach the database.
+_SCHEMA_READY = threading.Event()
+
+# Read endpoints only change when an admin job rewrites the tables, so their
+# payloads are memoised per process for a short TTL. Admin writes bump the
+# epoch, which clears the cache and stops in-flight builds from storing
+# results computed against the old data.
+_RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+_RESPONSE_CACHE_SIZE = 1024
+_response_cache: "OrderedDict[Tuple[Any, ...], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+_response_cache_epoch = 0
+
+
+def _invalidate_response_cache() -> None:
+    global _response_cache_epoch
+    with _response_cache_lock:
+        _response_cache_epoch += 1
+        _response_cache.clear()
+
+
+def _cached_response(endpoint: str) -> Callable:
+    """Memoise an endpoint's payload keyed on its arguments (LRU with TTL)."""
+
+    def decorator(func: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+            key = (endpoint, args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with _response_cache_lock:
+                hit = _response_cache.get(key)
+                if hit is not None and hit[0] > now:
+                    _response_cache.move_to_end(key)
+                    return hit[1]
+                epoch = _response_cache_epoch
+            payload = func(*args, **kwargs)
+            with _response_cache_lock:
+                if epoch == _response_cache_epoch:
+                    _response_cache[key] = (now + _RESPONSE_CACHE_TTL, payload)
+                    _response_cache.move_to_end(key)
+                    while len(_response_cache) > _RESPONSE_CACHE_SIZE:
+                        _response_cache.popitem(last=False)
+            return payload
+
+        return wrapper
+
+    return decorator
+
+
+def _load_seed_rows() -> List[Dict[str, Any]]:
+    """Return parsed seed rows, memoised on the CSV's path and mtime."""
+
+    global _SEED_CACHE
+    key = (str(SEED_CSV_PATH), SEED_CSV_PATH.stat().st_mtime_ns)
+    with _SEED_CACHE_LOCK:
+        if _SEED_CACHE is None or _SEED_CACHE[0] != key:
+            rows = [_parse_csv_row(row) for row in _iter_seed_csv(SEED_CSV_PATH)]
+            _SEED_CACHE = (key, rows)
+        return _SEED_CACHE[1]
+
+
+def _read_seed_rows() -> List[Dict[str, Any]]:
     """Load curated seed rows; invoked only by the admin seed endpoint."""
 
     if not SEED_CSV_PATH.exists():
@@ -95,41 +221,80 @@ def _read_seed_rows() -> List[Dict[str, str]]:
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Seed CSV not found at {SEED_CSV_PATH}",
         )
-    with SEED_CSV_PATH.open("r", encoding="utf-8") as handle:
-        rows = list(csv.DictReader(handle))
+    rows = _load_seed_rows()
     if not rows:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Seed CSV is empty")
     return rows
 
 
-def _parse_csv_row(row: Dict[str, str]) -> Dict[str, Any]:
-    sectors = normalize.parse_csv_sectors(row.get("sectors", ""))
-    capex_min = row.get("capex_min")
-    capex_max = row.get("capex_max")
-    seed_value = row.get("seed_month_value")
+def _iter_seed_csv(path: Path) -> Iterator[Tuple[Optional[str], ...]]:
+    """Yield seed rows as tuples ordered like ``_SEED_FIELDS``."""
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        reader = csv.reader(handle)
+        header = next(reader, [])
+        yield from normalize.project_csv_rows(reader, header, _SEED_FIELDS)
+
+
+def _parse_csv_row(row: Tuple[Optional[str], ...]) -> Dict[str, Any]:
+    hs_code, title, description, sectors, capex_min, capex_max, seed_value, top_country = row
     return {
-        "hs_code": (row.get("hs_code") or "").strip(),
-        "title": (row.get("title") or "").strip(),
-        "description": (row.get("description") or "").strip(),
-        "sectors": sectors,
+        "hs_code": (hs_code or "").strip(),
+        "title": (title or "").strip(),
+        "description": (description or "").strip(),
+        "sectors": normalize.parse_csv_sectors(sectors or ""),
         "capex_min": float(capex_min) if capex_min else None,
         "capex_max": float(capex_max) if capex_max else None,
         "seed_month_value": float(seed_value) if seed_value else None,
-        "top_country": (row.get("top_country") or "").strip() or None,
+        "top_country": (top_country or "").strip() or None,
     }
 
 
-@app.on_event("startup")
-def ensure_schema() -> None:
+def _init_schema() -> None:
     try:
         _require_database_url()
         with db.connect() as conn:
             db.ensure_extensions(conn)
             db.init_db(conn)
+        _SCHEMA_READY.set()
     except Exception as exc:  # pragma: no cover - best effort
         LOGGER.warning("Database init skipped: %s", exc)
 
 
+# Strong references so background startup tasks are not garbage collected.
+_background_tasks: Set["asyncio.Task[None]"] = set()
+
+
+@app.on_event("startup")
+async def ensure_schema() -> None:
+    """Run the schema DDL in a worker thread instead of blocking startup.
+
+    Concurrent workers still queue on init_db's advisory lock, but none of
+    them holds up its startup while waiting. The seed endpoint runs the DDL
+    itself if it is called before this has finished.
+    """
+    task = asyncio.create_task(anyio.to_thread.run_sync(_init_schema))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@app.on_event("startup")
+async def size_endpoint_threadpool() -> None:
+    """Match the threadpool running the sync endpoints to the DB pool size.
+
+    Each handler holds one pooled connection for its lifetime, so more threads
+    than connections only turns bursts into ``PoolError`` failures, while fewer
+    leaves connections idle as requests queue for a thread.
+    """
+    threads = int(os.getenv("API_THREADS") or os.getenv("DB_POOL_MAX", "25"))
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threads
+    LOGGER.info("Endpoint threadpool sized to %s", threads)
+
+
+@app.on_event("shutdown")
+def close_database_pool() -> None:
+    db.close_pool()
+
+
 @app.get("/", include_in_schema=False)
 def serve_index():
     index_path = CLIENT_DIR / "index.html"
@@ -146,42 +311,38 @@ def health() -> Dict[str, bool]:
 @app.post("/admin/seed")
 def seed_database(request: Request) -> Dict[str, Any]:
     _verify_admin(request)
-    rows = [_parse_csv_row(row) for row in _read_seed_rows()]
+    rows = _read_seed_rows()
     _require_database_url()
 
     now_iso = datetime.now(timezone.utc).isoformat()
     try:
+        seed_year = datetime.now(timezone.utc).year
+        # Later CSV rows win for duplicate HS codes, as with row-by-row upserts.
+        products = {
+            row["hs_code"]: (
+                row["hs_code"],
+                row["title"],
+                row["description"],
+                row["sectors"],
+                row["capex_min"],
+                row["capex_max"],
+            )
+            for row in rows
+        }
+        monthly_rows = (
+            (row["hs_code"], normalize.ensure_usd(row["seed_month_value"]), row["top_country"])
+            for row in rows
+        )
         with db.connect() as conn:
-            db.init_db(conn)
-            product_count = 0
-            monthly_count = 0
-            for row in rows:
-                db.upsert_product(
-                    conn,
-                    hs_code=row["hs_code"],
-                    title=row["title"],
-                    description=row["description"],
-                    sectors=row["sectors"],
-                    capex_min=row["capex_min"],
-                    capex_max=row["capex_max"],
-                )
-                product_count += 1
-                for month in range(1, 13):
-                    db.insert_monthly(
-                        conn,
-                        hs_code=row["hs_code"],
-                        year=datetime.now(timezone.utc).year,
-                        month=month,
-                        value_usd=normalize.ensure_usd(row["seed_month_value"]),
-                        value_inr=None,
-                        fx_rate=None,
-                        qty=None,
-                        partner=row["top_country"],
-                    )
-                    monthly_count += 1
+            if not _SCHEMA_READY.is_set():
+                db.init_db(conn)
+            product_count = db.bulk_upsert_products(conn, products.values())
+            monthly_count = db.seed_monthly(conn, monthly_rows, year=seed_year)
 
             baseline_summary = jobs.recompute_baseline(conn)
             progress_summary = jobs.recompute_progress(conn)
+        _SCHEMA_READY.set()
+        _invalidate_response_cache()
 
     except Exception as exc:
         LOGGER.exception("Error during seed_database execution")
@@ -227,8 +388,9 @@ def trigger_comtrade(
         )
         baseline_summary = jobs.recompute_baseline(conn)
         progress_summary = jobs.recompute_progress(conn)
+    _invalidate_response_cache()
 
-        summary.update(
+    summary.update(
         {
             "baseline": baseline_summary,
             "progress": progress_summary,
@@ -259,6 +421,7 @@ def trigger_dgcis(
         summary = dgcis.run(conn, source=source)
         baseline_summary = jobs.recompute_baseline(conn)
         progress_summary = jobs.recompute_progress(conn)
+    _invalidate_response_cache()
 
     summary.update(
         {
@@ -277,6 +440,7 @@ def trigger_recompute(request: Request) -> Dict[str, Any]:
     with db.connect() as conn:
         baseline_summary = jobs.recompute_baseline(conn)
         progress_summary = jobs.recompute_progress(conn)
+    _invalidate_response_cache()
     return {
         "baseline": baseline_summary,
         "progress": progress_summary,
@@ -309,9 +473,7 @@ def admin_diagnostics(request: Request) -> Dict[str, Any]:
     }
     if seed_exists:
         try:
-            with SEED_CSV_PATH.open("r", encoding="utf-8") as handle:
-                rows = list(csv.DictReader(handle))
-            seed_info["rows"] = len(rows)
+            seed_info["rows"] = len(_load_seed_rows())
         except Exception as exc:  # pragma: no cover - diagnostics only
             seed_info["error"] = str(exc)
 
@@ -367,6 +529,7 @@ def trigger_nightly(request: Request) -> Dict[str, Any]:
         summary = comtrade.run(conn, from_period=start_month, to_period=end_month)
         baseline_summary = jobs.recompute_baseline(conn)
         progress_summary = jobs.recompute_progress(conn)
+    _invalidate_response_cache()
 
     summary.update(
         {
@@ -380,7 +543,15 @@ def trigger_nightly(request: Request) -> Dict[str, Any]:
     return summary
 
 
+def _global_last_updated(rows: List[Dict[str, Any]]) -> Optional[str]:
+    """Return the ``MAX(...) OVER ()`` timestamp every listing row carries."""
+
+    stamp = rows[0]["global_last_updated"] if rows else None
+    return stamp.isoformat() if stamp else None
+
+
 @app.get("/api/products")
+@_cached_response("products")
 def list_products(
     sectors: Optional[str] = Query(default=None, description="Comma-separated sectors"),
     combine: str = Query(default="OR"),
@@ -393,21 +564,10 @@ def list_products(
     _require_database_url()
 
     combine = combine.upper()
-    if combine not in {"AND", "OR"}:
+    if combine not in _COMBINE_MODES:
         combine = "OR"
-    sort_map = {
-        "opportunity": "COALESCE(ip.opportunity_score, 0) DESC",
-        "progress": "COALESCE(ip.reduction_pct, 0) DESC",
-        "value": "COALESCE(ip.current_12m_usd, 0) DESC",
-    }
-    order_clause = sort_map.get(sort.lower(), sort_map["opportunity"])
+    order_clause = _SORT_MAP.get(sort.lower(), _SORT_MAP["opportunity"])
 
-    query_parts = [
-        "SELECT p.hs_code, p.title, p.description, p.sectors, p.capex_min, p.capex_max,",
-        "       ip.current_12m_usd, ip.reduction_pct, ip.opportunity_score, ip.last_updated",
-        "FROM products p",
-        "LEFT JOIN import_progress ip ON ip.hs_code = p.hs_code",
-    ]
     params: List[Any] = []
     conditions: List[str] = []
 
@@ -431,19 +591,15 @@ def list_products(
         conditions.append("(p.capex_min IS NULL OR p.capex_min <= %s)")
         params.append(max_capex)
 
-    if conditions:
-        query_parts.append("WHERE " + " AND ".join(conditions))
-    query_parts.append(f"ORDER BY {order_clause}")
-    query_parts.append("LIMIT %s")
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
     params.append(limit)
 
     with db.connect() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("\n".join(query_parts), params)
+            cur.execute(_PRODUCTS_SQL.format(where=where_clause, order=order_clause), params)
             rows = cur.fetchall()
 
     items: List[Dict[str, Any]] = []
-    last_updated: Optional[str] = None
     for row in rows:
         item = {
             "hs_code": row["hs_code"],
@@ -457,55 +613,27 @@ def list_products(
             "opportunity_score": float(row["opportunity_score"]) if row.get("opportunity_score") is not None else None,
             "last_updated": row["last_updated"].isoformat() if row.get("last_updated") else None,
         }
-        if item["last_updated"]:
-            last_updated = max(last_updated or item["last_updated"], item["last_updated"])
         items.append(item)
 
     return {
         "items": items,
         "count": len(items),
         "source": DEFAULT_SOURCE,
-        "last_updated": last_updated,
+        "last_updated": _global_last_updated(rows),
     }
 
 
 @app.get("/api/products/{hs_code}")
+@_cached_response("product_detail")
 def product_detail(hs_code: str) -> Dict[str, Any]:
     _require_database_url()
 
     with db.connect() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT p.hs_code, p.title, p.description, p.sectors, p.capex_min, p.capex_max,
-                       ip.current_12m_usd, ip.reduction_pct, ip.opportunity_score, ip.last_updated,
-                       ip.reduction_abs, ip.hhi_current, ip.hhi_baseline, ip.concentration_shift,
-                       b.baseline_period, b.baseline_12m_usd, b.updated_at
-                FROM products p
-                LEFT JOIN import_progress ip ON ip.hs_code = p.hs_code
-                LEFT JOIN baseline_imports b ON b.hs_code = p.hs_code
-                WHERE p.hs_code = %s
-                """,
-                (hs_code,),
-            )
+            cur.execute(_PRODUCT_DETAIL_SQL, {"hs_code": hs_code})
             row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-
-        timeseries = db.fetch_last_36m(conn, hs_code)
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT partner_country, SUM(value_usd) AS total
-                FROM monthly_imports
-                WHERE hs_code = %s
-                GROUP BY partner_country
-                ORDER BY total DESC
-                LIMIT 5
-                """,
-                (hs_code,),
-            )
-            partners = cur.fetchall()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
 
     product_card = ProductCard(
         hs_code=row["hs_code"],
@@ -529,7 +657,7 @@ def product_detail(hs_code: str) -> Dict[str, Any]:
             "qty": float(entry["qty"]) if entry.get("qty") is not None else None,
             "partner_country": entry.get("partner_country"),
         }
-        for entry in timeseries
+        for entry in row["timeseries"]
     ]
 
     partner_payload = [
@@ -537,7 +665,7 @@ def product_detail(hs_code: str) -> Dict[str, Any]:
             "partner_country": item.get("partner_country"),
             "value_usd": float(item.get("total") or 0),
         }
-        for item in partners
+        for item in row["partners"]
     ]
 
     progress_payload = {
@@ -563,32 +691,18 @@ def product_detail(hs_code: str) -> Dict[str, Any]:
 
 
 @app.get("/api/leaderboard")
+@_cached_response("leaderboard")
 def leaderboard(
     metric: str = Query(default="opportunity"),
     limit: int = Query(default=50, ge=1, le=200),
 ) -> Dict[str, Any]:
     _require_database_url()
 
-    sort_map = {
-        "opportunity": "COALESCE(ip.opportunity_score, 0) DESC",
-        "progress": "COALESCE(ip.reduction_pct, 0) DESC",
-        "value": "COALESCE(ip.current_12m_usd, 0) DESC",
-    }
-    order_clause = sort_map.get(metric.lower(), sort_map["opportunity"])
+    order_clause = _SORT_MAP.get(metric.lower(), _SORT_MAP["opportunity"])
 
     with db.connect() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                f"""
-                SELECT p.hs_code, p.title, p.sectors,
-                       ip.current_12m_usd, ip.reduction_pct, ip.opportunity_score, ip.last_updated
-                FROM products p
-                LEFT JOIN import_progress ip ON ip.hs_code = p.hs_code
-                ORDER BY {order_clause}
-                LIMIT %s
-                """,
-                (limit,),
-            )
+            cur.execute(_LEADERBOARD_SQL.format(order=order_clause), (limit,))
             rows = cur.fetchall()
 
     items = [
@@ -603,11 +717,7 @@ def leaderboard(
         }
         for row in rows
     ]
-    last_updated = None
-    for item in items:
-        if item["last_updated"]:
-            last_updated = max(last_updated or item["last_updated"], item["last_updated"])
-    return {"items": items, "source": DEFAULT_SOURCE, "last_updated": last_updated}
+    return {"items": items, "source": DEFAULT_SOURCE, "last_updated": _global_last_updated(rows)}
 
 
 @app.post("/api/domestic_capability")
@@ -644,15 +754,15 @@ def list_domestic_capability(hs_code: str) -> Dict[str, Any]:
     for row in rows:
         items.append(
             {
-                "id": row["id"],
-                "hs_code": row["hs_code"],
-                "capex_min": float(row["capex_min"]) if row.get("capex_min") is not None else None,
-                "capex_max": float(row["capex_max"]) if row.get("capex_max") is not None else None,
-                "machines": row.get("machines"),
-                "skills": row.get("skills"),
-                "notes": row.get("notes"),
-                "source": row.get("source"),
-                "verified": row.get("verified", False),
+                "id": row.id,
+                "hs_code": row.hs_code,
+                "capex_min": float(row.capex_min) if row.capex_min is not None else None,
+                "capex_max": float(row.capex_max) if row.capex_max is not None else None,
+                "machines": row.machines,
+                "skills": row.skills,
+                "notes": row.notes,
+                "source": row.source,
+                "verified": bool(row.verified),
             }
         )
     last_updated = datetime.now(timezone.utc).isoformat() if items else None
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import math
+from functools import lru_cache
 from typing import Dict, Iterable, List, Tuple
 
 
@@ -14,33 +15,39 @@ def norm_log(values: Dict[str, float] | Iterable[Tuple[str, float]]) -> Dict[str
     constant the values default to ``0.0`` to avoid division errors.
     """
 
-    if isinstance(values, dict):
-        items = list(values.items())
-    else:
-        items = list(values)
-    if not items:
+    pairs = values.items() if isinstance(values, dict) else values
+    keys: List[str] = []
+    logs: List[float] = []
+    log1p = math.log1p
+    for key, val in pairs:
+        keys.append(key)
+        logs.append(log1p(float(val)) if val is not None else 0.0)
+    if not logs:
         return {}
 
-    logs = [(key, math.log1p(float(val)) if val is not None else 0.0) for key, val in items]
-    log_values = [val for _, val in logs]
-    min_val = min(log_values)
-    max_val = max(log_values)
-    span = max_val - min_val
+    min_val = min(logs)
+    span = max(logs) - min_val
     if span == 0:
-        return {key: 0.0 for key, _ in logs}
-    return {key: (val - min_val) / span for key, val in logs}
+        return dict.fromkeys(keys, 0.0)
+    return {key: (val - min_val) / span for key, val in zip(keys, logs)}
 
 
-def hhi_from_shares(shares: List[float]) -> float | None:
+def hhi_from_shares(shares: Iterable[float | None]) -> float | None:
     """Calculate the Herfindahl-Hirschman Index from partner shares.
 
     Empty inputs return ``None``. The function expects fractional shares that
-    sum to roughly 1.0. The index is the sum of the squared shares.
+    sum to roughly 1.0. The index is the sum of the squared shares. Any
+    iterable works, e.g. the ``values()`` view of a share mapping.
     """
 
-    if not shares:
-        return None
-    return sum((float(share) if share is not None else 0.0) ** 2 for share in shares)
+    total = 0.0
+    seen = False
+    for share in shares:
+        seen = True
+        if share is not None:
+            value = float(share)
+            total += value * value
+    return total if seen else None
 
 
 SECTOR_TECH_FEASIBILITY = {
@@ -58,6 +65,13 @@ def tech_feasibility_for(sectors: Iterable[str] | None) -> float:
 
     if not sectors:
         return 0.6
+    return _tech_feasibility(tuple(sectors))
+
+
+@lru_cache(maxsize=1024)
+def _tech_feasibility(sectors: Tuple[str, ...]) -> float:
+    # Only a handful of distinct sector combinations exist, so products
+    # sharing one reuse the cached score.
     best = 0.0
     for sector in sectors:
         score = SECTOR_TECH_FEASIBILITY.get(sector.lower(), 0.6)
@@ -1,8 +1,12 @@
 import os
+import threading
+import time
 import unittest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+from urllib3.util.retry import RequestHistory
+
 from server.etl import comtrade
 
 
@@ -74,10 +78,72 @@ class ComtradeETLTest(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             comtrade.fetch_range("2024-01", "2024-01")
 
-
-    @patch("server.etl.comtrade.db.insert_monthly")
-    @patch("server.etl.comtrade.db.upsert_product")
-    def test_load_handles_missing_fx(self, mock_upsert, mock_insert):
+    def test_failed_chapter_cancels_prefetch_without_waiting(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        started = []
+
+        def fetch_chapter(chapter, url_prefix):
+            started.append(chapter)
+            if chapter == 3:
+                raise RuntimeError("chapter 3 failed")
+            if chapter > 3:
+                release.wait(5)
+            return []
+
+        with patch.dict(os.environ, {"COMTRADE_BASE": "https://example.com/api"}), patch.object(
+            comtrade, "CONCURRENCY", 1
+        ), patch.object(comtrade, "PREFETCH_CHAPTERS", 2), patch.object(comtrade, "_fetch_chapter", side_effect=fetch_chapter):
+            began = time.monotonic()
+            with self.assertRaisesRegex(RuntimeError, "chapter 3 failed"):
+                list(comtrade._fetch_range_iter("2024-01", "2024-01"))
+            elapsed = time.monotonic() - began
+        release.set()
+
+        self.assertLess(elapsed, 2)
+        self.assertLessEqual(max(started), 4)
+
+
+    @patch("server.etl.comtrade._HTTP")
+    def test_request_uses_pooled_client(self, mock_http):
+        mock_http.request.return_value = MagicMock(status=200, data=b'{"data": [{"cmdCode": "850760"}]}')
+        with patch.dict(os.environ, {"COMTRADE_BASE": "https://example.com/api", "COMTRADE_KEY": "secret"}):
+            payload = comtrade._request({"period": "202401"})
+
+        self.assertEqual(payload["data"][0]["cmdCode"], "850760")
+        method, url = mock_http.request.call_args[0]
+        self.assertEqual(method, "GET")
+        self.assertTrue(url.startswith("https://example.com/api/data?"))
+        headers = mock_http.request.call_args.kwargs["headers"]
+        self.assertEqual(headers["Ocp-Apim-Subscription-Key"], "secret")
+        self.assertEqual(headers["Accept-Encoding"], "gzip")
+
+    def test_build_periods_spans_year_boundary(self):
+        self.assertEqual(
+            list(comtrade._build_periods("2023-11", "202402")),
+            ["202311", "202312", "202401", "202402"],
+        )
+        self.assertEqual(list(comtrade._build_periods("2024-03", "2024-02")), [])
+
+    def test_retry_backoff_is_jittered_and_capped(self):
+        history = (RequestHistory("GET", "/data", None, 429, None),) * 3
+        retry = comtrade._JitteredRetry(total=4, backoff_factor=1, backoff_max=30, history=history)
+
+        with patch("server.etl.comtrade.random.uniform", return_value=1.5) as mock_uniform:
+            self.assertEqual(retry.get_backoff_time(), 1.5)
+        mock_uniform.assert_called_once_with(0, 8)
+        self.assertEqual(comtrade._JitteredRetry(total=4).get_backoff_time(), 0.0)
+
+    @patch("server.etl.comtrade._HTTP")
+    def test_request_raises_on_http_error(self, mock_http):
+        mock_http.request.return_value = MagicMock(status=400, data=b"bad period", reason="Bad Request")
+        with patch.dict(os.environ, {"COMTRADE_BASE": "https://example.com/api"}):
+            with self.assertRaises(RuntimeError):
+                comtrade._request({"period": "2024"})
+
+    @patch("server.etl.comtrade.db.copy_monthly")
+    @patch("server.etl.comtrade.db.bulk_upsert_products")
+    def test_load_handles_missing_fx(self, mock_upsert, mock_copy):
         record = comtrade.Record(
             hs_code="850760",
             title="Lithium-ion batteries",
@@ -93,18 +159,40 @@ class ComtradeETLTest(unittest.TestCase):
             partner_country="China",
         )
 
+        copied = []
+
+        def fake_copy(conn, rows, bulk_load=False):
+            self.assertTrue(bulk_load)
+            copied.extend(rows)
+            return len(copied)
+
+        mock_copy.side_effect = fake_copy
         with patch("server.etl.comtrade.forex.monthly_rate", side_effect=RuntimeError("missing")):
             products, rows = comtrade.load(MagicMock(), [record])
 
         self.assertEqual(products, 1)
         self.assertEqual(rows, 1)
         mock_upsert.assert_called_once()
-        mock_insert.assert_called_once()
-        kwargs = mock_insert.call_args.kwargs
-        self.assertEqual(kwargs["hs_code"], "850760")
-        self.assertIsNone(kwargs["fx_rate"])
-        self.assertAlmostEqual(kwargs["value_usd"], 1250000.0)
-        self.assertIsNone(kwargs["value_inr"])
+        mock_copy.assert_called_once()
+        hs_code, year, month, value_usd, value_inr, fx_rate, qty, partner = copied[0]
+        self.assertEqual(hs_code, "850760")
+        self.assertIsNone(fx_rate)
+        self.assertAlmostEqual(value_usd, 1250000.0)
+        self.assertIsNone(value_inr)
+
+    @patch("server.etl.comtrade.db.copy_monthly", side_effect=lambda conn, rows, **kwargs: len(list(rows)))
+    @patch("server.etl.comtrade.db.bulk_upsert_products")
+    def test_load_resolves_fx_once_per_month(self, mock_upsert, mock_copy):
+        records = [
+            comtrade.Record("850760", "Batteries", "", ["energy"], None, None, 2024, 1, 10.0, None, None, partner)
+            for partner in ("CHN", "KOR", "JPN")
+        ]
+
+        with patch("server.etl.comtrade.forex.monthly_rate", return_value=83.0) as mock_rate:
+            products, rows = comtrade.load(MagicMock(), records)
+
+        self.assertEqual((products, rows), (1, 3))
+        mock_rate.assert_called_once_with(2024, 1)
 
 
 if __name__ == "__main__":  # pragma: no cover
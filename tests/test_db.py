@@ -0,0 +1,98 @@
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+import psycopg2.extensions
+
+from server import db
+
+
+def _mock_conn(fetchone=None):
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.connection = conn
+    cur.fetchone.return_value = fetchone
+    return conn, cur
+
+
+class LatestYearMonthTest(unittest.TestCase):
+    def test_returns_most_recent_period(self):
+        conn, _ = _mock_conn(fetchone=(2024, 5))
+        self.assertEqual(db.latest_year_month(conn), (2024, 5))
+
+    def test_empty_table_returns_none(self):
+        conn, _ = _mock_conn(fetchone=None)
+        self.assertIsNone(db.latest_year_month(conn))
+
+
+class CopyMonthlyTest(unittest.TestCase):
+    def test_rows_are_copied_in_chunks_then_merged_once(self):
+        conn, cur = _mock_conn()
+        copied = []
+        cur.copy_expert.side_effect = lambda statement, buffer: copied.append(buffer.read())
+        rows = [("850760", 2024, month, 100.0, None, None, None, "CHN") for month in range(1, 6)]
+
+        count = db.copy_monthly(conn, iter(rows), chunk_rows=2)
+
+        self.assertEqual(count, 5)
+        self.assertEqual(len(copied), 3)
+        self.assertEqual(copied[0].splitlines()[0], "850760,2024,1,100.0,,,,CHN")
+        merges = [c for c in cur.execute.call_args_list if "INSERT INTO monthly_imports" in c.args[0]]
+        self.assertEqual(len(merges), 1)
+
+    def test_bulk_load_relaxes_commit_only_once_rows_arrive(self):
+        conn, cur = _mock_conn()
+        self.assertEqual(db.copy_monthly(conn, [], bulk_load=True), 0)
+        cur.execute.assert_not_called()
+
+        db.copy_monthly(conn, [("850760", 2024, 1, 100.0, None, None, None, "CHN")], bulk_load=True)
+        statements = [c.args[0] for c in cur.execute.call_args_list]
+        self.assertEqual(statements[0], "SET LOCAL synchronous_commit = off")
+        self.assertFalse(any("work_mem" in statement for statement in statements))
+
+    def test_empty_input_skips_database(self):
+        conn, cur = _mock_conn()
+        self.assertEqual(db.copy_monthly(conn, []), 0)
+        cur.execute.assert_not_called()
+
+
+class SeedMonthlyTest(unittest.TestCase):
+    def test_one_tuple_per_product_fans_out_server_side(self):
+        conn, cur = _mock_conn()
+        rows = [("850760", 100.0, "CHN"), ("854140", 50.0, None), ("850760", 120.0, "CHN")]
+
+        with patch.object(db, "execute_values") as execute_values:
+            count = db.seed_monthly(conn, iter(rows), year=2024)
+
+        self.assertEqual(count, 24)
+        statement, values = execute_values.call_args.args[1:3]
+        self.assertIn("generate_series(1, 12)", statement)
+        self.assertEqual(values, [("850760", 2024, 120.0, "CHN"), ("854140", 2024, 50.0, None)])
+
+    def test_empty_input_skips_database(self):
+        conn, cur = _mock_conn()
+        self.assertEqual(db.seed_monthly(conn, [], year=2024), 0)
+        conn.cursor.assert_not_called()
+
+
+class NumericDecodingTest(unittest.TestCase):
+    def test_numeric_is_decoded_as_float(self):
+        self.assertEqual(db.NUMERIC_AS_FLOAT("1234.50", None), 1234.5)
+        self.assertIsInstance(db.NUMERIC_AS_FLOAT("7", None), float)
+        self.assertIsNone(db.NUMERIC_AS_FLOAT(None, None))
+
+    def test_float_decoding_is_scoped_to_pooled_connections(self):
+        numeric_oid = psycopg2.extensions.DECIMAL.values[0]
+        self.assertIs(psycopg2.extensions.string_types[numeric_oid], psycopg2.extensions.DECIMAL)
+
+        db.close_pool()
+        self.addCleanup(db.close_pool)
+        with patch.dict(os.environ, {"DATABASE_URL": "postgresql://example/test"}), patch.object(
+            db, "ThreadedConnectionPool"
+        ) as pool_cls:
+            db._get_pool()
+        self.assertIs(pool_cls.call_args.kwargs["connection_factory"], db._PooledConnection)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
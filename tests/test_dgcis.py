@@ -1,4 +1,5 @@
 import os
+import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -23,16 +24,42 @@ class DGCISTest(unittest.TestCase):
         self.assertIsNotNone(sample.value_usd)
         self.assertIsNotNone(sample.fx_rate)
 
-    @patch("server.etl.dgcis.db.insert_monthly")
-    @patch("server.etl.dgcis.db.upsert_product")
-    def test_load_inserts_into_database(self, mock_upsert, mock_insert):
+    @patch("server.etl.dgcis.db.copy_monthly", side_effect=lambda conn, rows, **kwargs: len(list(rows)))
+    @patch("server.etl.dgcis.db.bulk_upsert_products")
+    def test_load_inserts_into_database(self, mock_upsert, mock_copy):
         records = dgcis.load_csv(Path("data/dgcis_sample.csv"))
         conn = MagicMock()
         products, rows = dgcis.load(conn, records)
         self.assertGreater(products, 0)
         self.assertEqual(rows, len(records))
-        self.assertEqual(mock_upsert.call_count, products)
-        self.assertEqual(mock_insert.call_count, rows)
+        mock_copy.assert_called_once()
+        mock_upsert.assert_called_once()
+        self.assertEqual(len(list(mock_upsert.call_args.args[1])), products)
+
+    def test_read_csv_projects_columns_and_pads_short_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "export.csv"
+            path.write_text("month,hs_code,year,value_inr,title\n1,850760,2024,100,Cells\n2,848180,2024\n\n")
+            rows = list(dgcis._read_csv(path))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0], ("850760", "2024", "1", "100", None, None, None, "Cells", None, None))
+        self.assertEqual(rows[1][:4], ("848180", "2024", "2", None))
+
+    def test_read_csv_ignores_cells_beyond_the_header(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "export.csv"
+            path.write_text("hs_code,year,month,value_inr\n850760,2024,1,100,EXTRA\n")
+            rows = list(dgcis._read_csv(path))
+
+        self.assertEqual(rows, [("850760", "2024", "1", "100", None, None, None, None, None, None)])
+
+    @patch("server.etl.dgcis.db.copy_monthly", side_effect=lambda conn, rows, **kwargs: len(list(rows)))
+    @patch("server.etl.dgcis.db.bulk_upsert_products")
+    def test_run_streams_records_into_load(self, mock_upsert, mock_copy):
+        summary = dgcis.run(MagicMock(), source=Path("data/dgcis_sample.csv"))
+        self.assertEqual(summary["monthly_rows"], len(dgcis.load_csv(Path("data/dgcis_sample.csv"))))
+        self.assertGreater(summary["products"], 0)
 
     def test_missing_file_raises(self):
         with self.assertRaises(RuntimeError):
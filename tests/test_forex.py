@@ -1,6 +1,8 @@
 import os
+import tempfile
 import unittest
 from pathlib import Path
+from unittest.mock import patch
 
 from server import forex
 
@@ -21,6 +23,34 @@ class ForexTest(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             forex.monthly_rate(2025, 1)
 
+    def test_repeat_lookups_skip_file_resolution(self):
+        with patch("server.forex._rates_file", wraps=forex._rates_file) as mock_file:
+            first = forex.monthly_rate(2024, 1)
+            second = forex.monthly_rate(2024, "1")
+        self.assertEqual(first, second)
+        self.assertEqual(mock_file.call_count, 1)
+
+    def test_edited_file_is_reloaded_for_new_months(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "fx.csv"
+            path.write_text("year,month,usd_to_inr\n2024,1,83.0\n")
+            with patch.dict(os.environ, {"FX_RATES_FILE": str(path)}):
+                self.assertEqual(forex.monthly_rate(2024, 1), 83.0)
+                with self.assertRaises(RuntimeError):
+                    forex.monthly_rate(2024, 2)
+                path.write_text("year,month,usd_to_inr\n2024,1,83.0\n2024,2,83.5\n2024,3,83.6\n")
+                os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000))
+                self.assertEqual(forex.monthly_rate(2024, 3), 83.6)
+                # Reloading the edited file also dropped the memoised miss.
+                self.assertEqual(forex.monthly_rate(2024, 2), 83.5)
+
+    def test_repeat_misses_skip_file_resolution(self):
+        with patch("server.forex._rates_file", wraps=forex._rates_file) as mock_file:
+            for _ in range(3):
+                with self.assertRaises(RuntimeError):
+                    forex.monthly_rate(2025, 1)
+        self.assertEqual(mock_file.call_count, 1)
+
 
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
 
-from server import jobs
+from server import jobs, util
 
 
 class WindowingTest(unittest.TestCase):
@@ -29,5 +31,77 @@ class WindowingTest(unittest.TestCase):
         self.assertEqual(april_entry.total, 0.0)
 
 
+class ProductSeriesTest(unittest.TestCase):
+    def test_products_are_grouped_with_baseline_from_one_query(self):
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.__iter__.return_value = iter(
+            [
+                ("850760", ["energy"], 30, date(2024, 1, 1), date(2024, 12, 1), 2024, 1, 10),
+                ("850760", ["energy"], 30, date(2024, 1, 1), date(2024, 12, 1), 2024, 2, None),
+                ("854231", None, None, None, None, None, None, None),
+            ]
+        )
+
+        products = list(jobs._iter_product_series(conn))
+
+        cur.execute.assert_called_once()
+        self.assertEqual(
+            products,
+            [
+                jobs.ProductSeries(
+                    "850760",
+                    ["energy"],
+                    30.0,
+                    date(2024, 1, 1),
+                    date(2024, 12, 1),
+                    [jobs.MonthlyTotal(2024, 1, 10.0), jobs.MonthlyTotal(2024, 2, 0.0)],
+                ),
+                jobs.ProductSeries("854231", [], None, None, None, []),
+            ],
+        )
+
+
+class RecomputeBaselineTest(unittest.TestCase):
+    def test_baseline_is_recomputed_in_one_statement(self):
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchone.return_value = (3, 2)
+
+        summary = jobs.recompute_baseline(conn)
+
+        self.assertEqual(summary, {"processed": 3, "with_baseline": 2})
+        cur.execute.assert_called_once_with(jobs._RECOMPUTE_BASELINE_SQL)
+
+
+class RecomputeProgressTest(unittest.TestCase):
+    @patch("server.jobs.db.bulk_upsert_progress")
+    @patch("server.jobs.db.partner_shares_many")
+    def test_scores_match_norm_log_and_hhi(self, mock_shares, mock_upsert):
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        months = [(year, month) for year in (2023, 2024) for month in range(1, 13)]
+        baseline = (100.0, date(2023, 1, 1), date(2023, 12, 1))
+        product_rows = [("850760", ["electronics"], *baseline, y, m, 10) for y, m in months]
+        product_rows += [("854231", ["energy"], None, None, None, y, m, 1000) for y, m in months]
+        product_rows += [("999999", None, None, None, None, None, None, None)]
+        cur.__iter__.return_value = iter(product_rows)
+        mock_shares.return_value = {
+            ("850760", "baseline"): {"CHN": 1.0},
+            ("850760", "current"): {"CHN": 0.5, "KOR": 0.5},
+            ("854231", "current"): {"JPN": 0.5, "USA": 0.5},
+        }
+
+        self.assertEqual(jobs.recompute_progress(conn), {"processed": 3})
+
+        rows = {row[0]: row for row in mock_upsert.call_args.args[1]}
+        norm = util.norm_log({"850760": 120.0, "854231": 12000.0})
+        self.assertEqual(rows["850760"][1:5], (100.0, 120.0, -20.0, -0.2))
+        self.assertEqual(rows["850760"][5:8], (1.0, 0.5, 0.5))
+        self.assertAlmostEqual(rows["850760"][8], norm["850760"] * 0.5 * 0.7)
+        self.assertAlmostEqual(rows["854231"][8], norm["854231"] * 0.5 * 0.6)
+        self.assertEqual(rows["999999"][2:], (None,) * 7)
+
+
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
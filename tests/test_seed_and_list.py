@@ -1,5 +1,12 @@
+import asyncio
 import os
+import tempfile
+import threading
+from datetime import datetime, timezone
 import unittest
+from pathlib import Path
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
 
 from fastapi import HTTPException
 
@@ -33,5 +40,159 @@ class SeedAndListingTest(unittest.TestCase):
         self.assertEqual(ctx.exception.status_code, 500)
 
 
+class ListingQueryTest(unittest.TestCase):
+    def setUp(self):
+        main._invalidate_response_cache()
+        self.addCleanup(main._invalidate_response_cache)
+        os.environ["DATABASE_URL"] = "postgresql://example/test"
+        self.addCleanup(os.environ.pop, "DATABASE_URL", None)
+        self.cur = MagicMock()
+        self.cur.fetchall.return_value = []
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value = self.cur
+
+        @contextmanager
+        def fake_connect():
+            yield conn
+
+        patcher = patch.object(main.db, "connect", fake_connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_filters_are_parameterised_and_sort_falls_back(self):
+        main.list_products(
+            sectors="energy, auto",
+            combine="and",
+            min_capex=5.0,
+            max_capex=None,
+            sort="bogus",
+            limit=10,
+            q=None,
+        )
+        sql, params = self.cur.execute.call_args.args
+        self.assertIn("WHERE p.sectors @> %s AND (p.capex_max IS NULL OR p.capex_max >= %s)", sql)
+        self.assertIn("ORDER BY COALESCE(ip.opportunity_score, 0) DESC", sql)
+        self.assertEqual(params, [["energy", "auto"], 5.0, 10])
+
+    def test_leaderboard_orders_by_metric(self):
+        main.leaderboard(metric="value", limit=5)
+        sql, params = self.cur.execute.call_args.args
+        self.assertIn("ORDER BY COALESCE(ip.current_12m_usd, 0) DESC", sql)
+        self.assertEqual(params, (5,))
+
+    def test_last_updated_comes_from_the_window_aggregate(self):
+        latest = datetime(2024, 6, 1, tzinfo=timezone.utc)
+        self.cur.fetchall.return_value = [
+            {"hs_code": "850760", "title": "Batteries", "last_updated": None, "global_last_updated": latest},
+        ]
+        payload = main.leaderboard(metric="opportunity", limit=5)
+        self.assertIn("MAX(ip.last_updated) OVER () AS global_last_updated", self.cur.execute.call_args.args[0])
+        self.assertEqual(payload["last_updated"], latest.isoformat())
+        self.assertIsNone(payload["items"][0]["last_updated"])
+
+    def test_responses_are_cached_until_admin_writes(self):
+        first = main.leaderboard(metric="value", limit=5)
+        self.assertIs(main.leaderboard(metric="value", limit=5), first)
+        main.leaderboard(metric="progress", limit=5)
+        self.assertEqual(self.cur.execute.call_count, 2)
+
+        main._invalidate_response_cache()
+        main.leaderboard(metric="value", limit=5)
+        self.assertEqual(self.cur.execute.call_count, 3)
+
+    def test_detail_reads_activity_in_the_same_query(self):
+        self.cur.fetchone.return_value = {
+            "hs_code": "850760",
+            "title": "Batteries",
+            "sectors": ["energy"],
+            "current_12m_usd": 1200,
+            "timeseries": [{"year": 2024, "month": 1, "value_usd": 100, "partner_country": "CHN"}],
+            "partners": [{"partner_country": "CHN", "total": 100}],
+        }
+        payload = main.product_detail("850760")
+        self.assertEqual(self.cur.execute.call_count, 1)
+        self.assertEqual(self.cur.execute.call_args.args[1], {"hs_code": "850760"})
+        self.assertEqual(payload["timeseries"][0]["value_usd"], 100.0)
+        self.assertEqual(payload["partners"], [{"partner_country": "CHN", "value_usd": 100.0}])
+
+    def test_detail_missing_product_is_404(self):
+        self.cur.fetchone.return_value = None
+        with self.assertRaises(HTTPException) as ctx:
+            main.product_detail("000000")
+        self.assertEqual(ctx.exception.status_code, 404)
+
+
+class SchemaStartupTest(unittest.TestCase):
+    def test_startup_returns_before_schema_ddl_finishes(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        finished = threading.Event()
+
+        def slow_init():
+            release.wait(5)
+            finished.set()
+
+        async def run_startup():
+            with patch.object(main, "_init_schema", slow_init):
+                await main.ensure_schema()
+                self.assertFalse(finished.is_set())
+                release.set()
+                await asyncio.gather(*main._background_tasks)
+
+        asyncio.run(run_startup())
+        self.assertTrue(finished.is_set())
+
+
+class SeedRowsCacheTest(unittest.TestCase):
+    HEADER = "hs_code,title,description,sectors,capex_min,capex_max,seed_month_value,top_country\n"
+
+    def setUp(self):
+        main._SEED_CACHE = None
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "seed.csv"
+        self.path.write_text(self.HEADER + "850760,Batteries,,energy;auto,10,20,100,CHN\n", encoding="utf-8")
+        patcher = patch.object(main, "SEED_CSV_PATH", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, main, "_SEED_CACHE", None)
+
+    def test_rows_are_parsed_once_per_file_revision(self):
+        first = main._read_seed_rows()
+        self.assertIs(main._read_seed_rows(), first)
+        self.assertEqual(first[0]["hs_code"], "850760")
+        self.assertEqual(first[0]["capex_max"], 20.0)
+
+        self.path.write_text(self.HEADER + "854140,Solar cells,,energy,5,,50,CHN\n", encoding="utf-8")
+        stat = self.path.stat()
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        reloaded = main._read_seed_rows()
+        self.assertEqual([row["hs_code"] for row in reloaded], ["854140"])
+        self.assertIsNone(reloaded[0]["capex_max"])
+
+    def test_short_rows_and_missing_columns_parse_as_blank(self):
+        self.path.write_text("hs_code,title,capex_min\n850760,Batteries\n\n", encoding="utf-8")
+        rows = main._read_seed_rows()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["title"], "Batteries")
+        self.assertIsNone(rows[0]["capex_min"])
+        self.assertEqual(rows[0]["sectors"], [])
+        self.assertIsNone(rows[0]["top_country"])
+
+    def test_cells_beyond_the_header_are_ignored(self):
+        self.path.write_text("hs_code,title,seed_month_value\n850760,Batteries,100,stray note\n", encoding="utf-8")
+        rows = main._read_seed_rows()
+        self.assertEqual(rows[0]["seed_month_value"], 100.0)
+        self.assertIsNone(rows[0]["capex_min"])
+        self.assertIsNone(rows[0]["top_country"])
+
+    def test_empty_file_is_rejected(self):
+        self.path.write_text(self.HEADER, encoding="utf-8")
+        with self.assertRaises(HTTPException) as ctx:
+            main._read_seed_rows()
+        self.assertEqual(ctx.exception.status_code, 400)
+
+
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()